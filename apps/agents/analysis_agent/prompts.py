@@ -17,7 +17,7 @@ HERRAMIENTAS DISPONIBLES:
 3. ANÁLISIS GLOBALES (NO requieren IDs):
    - get_high_risk_clients(limit): Lista clientes ordenados por riesgo
    - get_deteriorating_clients(limit, min_invoices): Clientes cuyo comportamiento empeora
-   - get_aging_report(): Informe de antigüedad de deuda por buckets
+   - get_aging_report(): Informe de antigüedad de deuda por buckets (límites configurables con bucket_edges y desglose por compañía o moneda con group_by)
    - get_portfolio_summary(): Resumen ejecutivo de la cartera de cobros
 
 4. GRÁFICOS PERSONALIZADOS:
@@ -170,20 +170,30 @@ async def compare_clients(partner_ids: list[int]) -> str:
 
 
 @tool(args_schema=GetAgingReportInput)
-async def get_aging_report(partner_id: int = None) -> str:
+async def get_aging_report(partner_id: int = None, bucket_edges: list[int] = None,
+                           group_by: str = None) -> str:
     """Genera un informe de antigüedad de deuda (aging report).
-    Distribuye las facturas vencidas en buckets: 0-30, 31-60, 61-90, >90 días.
-    Incluye gráfico de barras con la distribución.
+    Distribuye las facturas vencidas en buckets: por defecto 0-30, 31-60, 61-90, >90 días.
+    Incluye gráfico de barras con la distribución y, si se indica group_by, otro
+    con una serie por compañía o moneda.
 
     Args:
         partner_id: ID del cliente (opcional). Si se proporciona, genera el aging
                    solo para ese cliente. Si no, genera el aging de toda la cartera.
+        bucket_edges: Límites de los buckets en días (opcional), ej. [0, 15, 30, 60, 90, 180, 365].
+        group_by: Desglose opcional por 'company' (compañía) o 'currency' (moneda).
 
     Returns:
-        str: Informe con datos y gráfico incluido.
+        str: Informe con datos (incluido el desglose ``groups``) y gráficos, o un
+        mensaje de error si los límites de los buckets no son válidos.
     """
     dm = get_data_manager()
-    report = await dm.get_aging_report(partner_id=partner_id)
+    try:
+        report = await dm.get_aging_report(partner_id=partner_id, bucket_edges=bucket_edges,
+                                           group_by=group_by)
+    except ValueError as e:
+        return (f"No se pudo generar el aging report: {e}. Los límites de los buckets deben ser "
+                f"días enteros no negativos y estrictamente crecientes, ej. [0, 30, 60, 90].")
     
     labels = []
     values = []
@@ -195,17 +205,33 @@ async def get_aging_report(partner_id: int = None) -> str:
     if partner_id:
         title = f"Aging Report - Cliente ID {partner_id}"
     
-    chart_id = await chart_generator.create_chart(
+    charts = [await chart_generator.create_chart(
         chart_type="bar",
         title=title,
         data={"labels": labels, "values": values},
         show_values=True
-    )
-    fig = chart_generator.get_chart(chart_id)
-    chart_json = fig.to_json()
-    chart_generator.clear_chart(chart_id)
+    )]
+    # Desglose por compañía o moneda: una serie por grupo
+    if report.groups:
+        charts.append(await chart_generator.create_chart(
+            chart_type="bar",
+            title=f"{title} por {'compañía' if report.group_by == 'company' else 'moneda'}",
+            data={
+                "labels": labels,
+                "series": [
+                    {"name": group.name, "values": [b.total_amount_eur for b in group.buckets]}
+                    for group in report.groups
+                ]
+            },
+            show_values=False
+        ))
+    chart_jsons = []
+    for chart_id in charts:
+        chart_jsons.append(chart_generator.get_chart(chart_id).to_json())
+        chart_generator.clear_chart(chart_id)
     
-    return f"{report.model_dump_json()} CHART_JSON:{chart_json}"
+    charts_str = " ".join(f"CHART_JSON:{chart_json}" for chart_json in chart_jsons)
+    return f"{report.model_dump_json()} {charts_str}"
 
 
 @tool
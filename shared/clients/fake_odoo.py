@@ -0,0 +1,112 @@
+import json
+from typing import Dict, List
+
+import httpx
+
+from shared.utils.odoo_domain import match_domain, sort_records
+
+
+class FakeOdoo:
+    """Servidor Odoo falso en memoria que responde al endpoint ``/jsonrpc``.
+
+    Pensado para pruebas locales de :class:`AsyncOdooConnection` sin una
+    instancia real de Odoo::
+
+        fake = FakeOdoo({'account.move': [...], 'res.partner': [...]})
+        connection = AsyncOdooConnection(transport=fake.transport, url="http://odoo.test",
+                                         db="test", username="admin", password="admin")
+
+    Soporta ``login`` y los métodos ``search_read``, ``search``, ``search_count``,
+    ``read`` y ``read_group`` (agregación ``sum`` sobre campos simples). Los dominios se evalúan con :func:`match_domain`.
+
+    Attributes:
+        records (dict): Registros por modelo.
+        request_count (int): Número de peticiones recibidas.
+    """
+
+    def __init__(self, records: Dict[str, List[dict]] = None, uid: int = 2):
+        self.records = records or {}
+        self.uid = uid
+        self.request_count = 0
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        """Transporte httpx que enruta las peticiones a este servidor falso."""
+        return httpx.MockTransport(self._handle)
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.request_count += 1
+        payload = json.loads(request.content)
+        params = payload["params"]
+        try:
+            result = self._dispatch(params["service"], params["method"], params["args"])
+            body = {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+        except Exception as e:
+            body = {"jsonrpc": "2.0", "id": payload["id"],
+                    "error": {"code": 200, "message": "Odoo Server Error",
+                              "data": {"message": str(e)}}}
+        return httpx.Response(200, json=body)
+
+    def _dispatch(self, service: str, method: str, args: list):
+        if service == "common" and method == "login":
+            return self.uid
+        if service == "object" and method == "execute_kw":
+            _db, _uid, _password, model, model_method, model_args, kwargs = args
+            handler = getattr(self, f"_{model_method}", None)
+            if handler is None:
+                raise NotImplementedError(f"Método no soportado por FakeOdoo: {model_method}")
+            return handler(model, *model_args, **kwargs)
+        raise NotImplementedError(f"Servicio no soportado por FakeOdoo: {service}.{method}")
+
+    # =========================================================================
+    # MÉTODOS DEL ORM
+    # =========================================================================
+
+    def _search_records(self, model: str, domain: list, offset: int = 0,
+                        limit: int = None, order: str = None) -> List[dict]:
+        records = [r for r in self.records.get(model, []) if match_domain(r, domain)]
+        records = sort_records(records, order)
+        end = offset + limit if limit else None
+        return records[offset:end]
+
+    def _search_read(self, model: str, domain: list = None, fields: list = None,
+                     offset: int = 0, limit: int = None, order: str = None) -> List[dict]:
+        records = self._search_records(model, domain or [], offset, limit, order)
+        fields = list(dict.fromkeys(['id', *(fields or [])]))
+        return [{field: record.get(field, False) for field in fields} for record in records]
+
+    def _search(self, model: str, domain: list = None, offset: int = 0,
+                limit: int = None, order: str = None) -> List[int]:
+        return [r['id'] for r in self._search_records(model, domain or [], offset, limit, order)]
+
+    def _search_count(self, model: str, domain: list = None) -> int:
+        return len(self._search_records(model, domain or []))
+
+    def _read(self, model: str, ids: list, fields: list = None) -> List[dict]:
+        return self._search_read(model, [('id', 'in', list(ids))], fields)
+
+    def _read_group(self, model: str, domain: list, fields: list, groupby: list,
+                    offset: int = 0, limit: int = None, orderby: str = None,
+                    lazy: bool = True) -> List[dict]:
+        groupby = [groupby] if isinstance(groupby, str) else list(groupby)
+        if lazy:
+            groupby = groupby[:1]
+        aggregates = [f.split(':')[0] for f in fields if f.split(':')[0] not in groupby]
+
+        groups: Dict[tuple, dict] = {}
+        for record in self._search_records(model, domain):
+            key = tuple(str(record.get(field, False)) for field in groupby)
+            if key not in groups:
+                groups[key] = {field: record.get(field, False) for field in groupby}
+                groups[key].update({field: 0 for field in aggregates})
+                groups[key]['__count'] = 0
+            for field in aggregates:
+                groups[key][field] += record.get(field) or 0
+            groups[key]['__count'] += 1
+
+        rows = list(groups.values())
+        if lazy and groupby:
+            for row in rows:
+                row[f"{groupby[0]}_count"] = row.pop('__count')
+        end = offset + limit if limit else None
+        return rows[offset:end]
@@ -1,14 +1,49 @@
 from shared.config.settings import settings
 import odoorpc
+from odoorpc.error import RPCError, InternalError
 import asyncio
+import http.client
+import time
+
+# Errores tras los que se vuelve a autenticar el cliente y se reintenta la llamada
+_CONNECTION_ERRORS = (OSError, http.client.HTTPException, InternalError)
+
+
+def _is_session_error(error: Exception) -> bool:
+    """Indica si un error de Odoo se debe a una sesión caducada o a la conexión.
+
+    Solo cuentan la pérdida de conexión (incluidos los HTTP 401/403 del
+    transporte, que ``urllib`` lanza como ``OSError``) y la
+    ``SessionExpiredException`` de Odoo (código 100). Los errores de permisos
+    (``AccessError``, "access denied") se propagan sin volver a autenticar.
+    """
+    if isinstance(error, _CONNECTION_ERRORS):
+        return True
+    if isinstance(error, RPCError):
+        info = error.info if isinstance(error.info, dict) else {}
+        data = info.get('data') or {}
+        if info.get('code') == 100 or 'SessionExpiredException' in str(data.get('name', '')):
+            return True
+        return 'session expired' in str(error).lower()
+    return False
 
 
 class OdooConnection:
-    """Gestiona la conexión con Odoo mediante JSON-RPC."""
+    """Gestiona la conexión con Odoo mediante JSON-RPC.
 
-    def __init__(self):
+    Mantiene un pool de clientes ``odoorpc`` autenticados, cada uno con su
+    propia sesión HTTP, para que las peticiones concurrentes se ejecuten
+    realmente en paralelo.
+
+    Attributes:
+        pool_size (int): Número de clientes autenticados en el pool.
+        health_check_interval (float): Segundos de inactividad tras los que
+            se comprueba un cliente antes de usarlo.
+    """
+
+    def __init__(self, pool_size: int = None):
         # Validar que las credenciales estén en el entorno
-        if not all([settings.ODOO_URL, settings.ODOO_DB, 
+        if not all([settings.ODOO_URL, settings.ODOO_DB,
                     settings.ODOO_USERNAME, settings.ODOO_PASSWORD]):
             raise ValueError("Credenciales de Odoo no configuradas. "
                 "Asegúrate de definir ODOO_URL, ODOO_DB, ODOO_USERNAME y ODOO_PASSWORD.")
@@ -18,21 +53,42 @@ class OdooConnection:
         self.password = settings.ODOO_PASSWORD
         self.client = None
 
+        self.pool_size = pool_size or settings.ODOO_POOL_SIZE
+        self.health_check_interval = 60.0
+        self._pool: asyncio.Queue | None = None
+
+        # Métricas del pool
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._relogins = 0
+        self._failed_health_checks = 0
+
+
+    def _login(self) -> odoorpc.ODOO:
+        """Crea un cliente ODOO autenticado (bloqueante)."""
+        host = self.url.replace("https://", "").split(":")[0].split("/")[0]
+        port = 443
+        protocol = "jsonrpc+ssl"
+        client = odoorpc.ODOO(host, protocol=protocol, port=port)
+        client.login(self.db, self.username, self.password)
+        return client
+
 
     async def connect(self):
-        """Establece la conexión con Odoo.
+        """Establece la conexión con Odoo autenticando todos los clientes del pool.
 
         Returns:
             Cliente ODOO conectado y autenticado.
         """
-        def _connect():
-            host = self.url.replace("https://", "").split(":")[0].split("/")[0]
-            port = 443
-            protocol = "jsonrpc+ssl"
-            client = odoorpc.ODOO(host, protocol=protocol, port=port)
-            client.login(self.db, self.username, self.password)
-            return client
-        self.client = await asyncio.to_thread(_connect)
+        clients = await asyncio.gather(*[
+            asyncio.to_thread(self._login) for _ in range(self.pool_size)
+        ])
+        self._pool = asyncio.Queue()
+        for client in clients:
+            self._pool.put_nowait((client, time.monotonic()))
+        self.client = clients[0]
         return self.client
 
 
@@ -45,7 +101,90 @@ class OdooConnection:
         return self.client is not None
 
 
-    async def search_read(self, model, domain, fields, limit=0, offset=0):
+    def _is_healthy(self, client: odoorpc.ODOO) -> bool:
+        """Comprueba con una llamada ligera que la sesión del cliente sigue activa."""
+        try:
+            client.execute_kw('res.users', 'search_count', [[('id', '=', client.env.uid)]])
+            return True
+        except Exception:
+            return False
+
+
+    async def _acquire(self) -> odoorpc.ODOO:
+        """Saca un cliente del pool, esperando si todos están en uso."""
+        start = time.perf_counter()
+        client, last_used = await self._pool.get()
+        wait = time.perf_counter() - start
+
+        self._in_use += 1
+        self._checkouts += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+
+        if time.monotonic() - last_used > self.health_check_interval:
+            if not await asyncio.to_thread(self._is_healthy, client):
+                self._failed_health_checks += 1
+                try:
+                    client = await self._relogin()
+                except Exception:
+                    self._release(client)
+                    raise
+        return client
+
+
+    def _release(self, client: odoorpc.ODOO) -> None:
+        """Devuelve un cliente al pool."""
+        self._in_use -= 1
+        self._pool.put_nowait((client, time.monotonic()))
+
+
+    async def _relogin(self) -> odoorpc.ODOO:
+        """Crea un cliente nuevo para sustituir a uno con la sesión caducada."""
+        self._relogins += 1
+        return await asyncio.to_thread(self._login)
+
+
+    async def _run(self, func):
+        """Ejecuta ``func(client)`` en un hilo con un cliente del pool.
+
+        Si la sesión ha caducado o se ha perdido la conexión, vuelve a
+        autenticar el cliente y reintenta una vez.
+        """
+        if self._pool is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+        client = await self._acquire()
+        try:
+            try:
+                return await asyncio.to_thread(func, client)
+            except Exception as e:
+                if not _is_session_error(e):
+                    raise
+                client = await self._relogin()
+                return await asyncio.to_thread(func, client)
+        finally:
+            self._release(client)
+
+
+    def get_pool_stats(self) -> dict:
+        """Devuelve las métricas del pool de conexiones.
+
+        Returns:
+            Diccionario con tamaño, clientes en uso y disponibles, número de
+            préstamos, espera media y máxima (ms), re-logins y health checks fallidos.
+        """
+        return {
+            "pool_size": self.pool_size,
+            "in_use": self._in_use,
+            "available": self._pool.qsize() if self._pool is not None else 0,
+            "checkouts": self._checkouts,
+            "avg_wait_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 3),
+            "relogins": self._relogins,
+            "failed_health_checks": self._failed_health_checks,
+        }
+
+
+    async def search_read(self, model, domain, fields, limit=0, offset=0, order=None):
         """Ejecuta search_read en Odoo.
 
         Args:
@@ -54,13 +193,18 @@ class OdooConnection:
             fields: Campos a recuperar.
             limit: Número máximo de registros.
             offset: Desplazamiento inicial.
+            order: Criterio de ordenación (ej. ``'id asc'``). Si es None, usa el del modelo.
 
         Returns:
             Lista de registros encontrados.
         """
-        def _search_read():
-            return self.client.env[model].search_read(domain, fields, limit=limit, offset=offset)
-        return await asyncio.to_thread(_search_read)
+        kwargs = {'limit': limit, 'offset': offset}
+        if order:
+            kwargs['order'] = order
+
+        def _search_read(client):
+            return client.env[model].search_read(domain, fields, **kwargs)
+        return await self._run(_search_read)
 
 
     async def execute_kw(self, model, method, args, kwargs=None):
@@ -75,6 +219,6 @@ class OdooConnection:
         Returns:
             Resultado del método ejecutado.
         """
-        def _execute():
-            return self.client.execute_kw(model, method, args, kwargs or {})
-        return await asyncio.to_thread(_execute)
+        def _execute(client):
+            return client.execute_kw(model, method, args, kwargs or {})
+        return await self._run(_execute)
@@ -0,0 +1,190 @@
+import asyncio
+import importlib.util
+import itertools
+import time
+
+import httpx
+
+from shared.config.settings import settings
+
+
+class OdooRPCError(Exception):
+    """Error devuelto por el endpoint JSON-RPC de Odoo."""
+
+
+class AsyncOdooConnection:
+    """Conexión con Odoo hablando directamente con el endpoint ``/jsonrpc``.
+
+    Alternativa nativa de asyncio a :class:`OdooConnection`: no usa hilos y
+    comparte un único ``httpx.AsyncClient`` con keep-alive, HTTP/2 si el
+    paquete ``h2`` está instalado y respuestas comprimidas con gzip. Mantiene
+    las firmas de ``search_read`` y ``execute_kw``, por lo que
+    :class:`DataRetriever` funciona sin cambios.
+
+    Attributes:
+        pool_size (int): Máximo de peticiones simultáneas (y conexiones keep-alive).
+        timeout (float): Timeout de cada petición en segundos.
+    """
+
+    def __init__(self, pool_size: int = None, transport: httpx.AsyncBaseTransport = None,
+                 url: str = None, db: str = None, username: str = None, password: str = None):
+        self.url = url or settings.ODOO_URL
+        self.db = db or settings.ODOO_DB
+        self.username = username or settings.ODOO_USERNAME
+        self.password = password or settings.ODOO_PASSWORD
+        # Validar que las credenciales estén en el entorno
+        if not all([self.url, self.db, self.username, self.password]):
+            raise ValueError("Credenciales de Odoo no configuradas. "
+                "Asegúrate de definir ODOO_URL, ODOO_DB, ODOO_USERNAME y ODOO_PASSWORD.")
+        self.client = None
+        self.uid = None
+        self.pool_size = pool_size or settings.ODOO_POOL_SIZE
+        self.timeout = 120.0
+
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(self.pool_size)
+        self._request_ids = itertools.count(1)
+
+        # Métricas
+        self._in_use = 0
+        self._requests = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._retries = 0
+
+
+    async def connect(self):
+        """Crea el cliente HTTP compartido y se autentica en Odoo.
+
+        Returns:
+            Cliente HTTP conectado.
+        """
+        http2 = self._transport is None and importlib.util.find_spec("h2") is not None
+        self.client = httpx.AsyncClient(
+            base_url=self.url.rstrip("/"),
+            http2=http2,
+            transport=self._transport,
+            timeout=self.timeout,
+            headers={"Accept-Encoding": "gzip"},
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size
+            ),
+        )
+        uid = await self._call("common", "login", [self.db, self.username, self.password])
+        if not uid:
+            await self.close()
+            raise OdooRPCError("Credenciales de Odoo incorrectas.")
+        self.uid = uid
+        return self.client
+
+
+    async def close(self) -> None:
+        """Cierra el cliente HTTP."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+    async def is_connected(self) -> bool:
+        """Verifica si hay una conexión activa.
+
+        Returns:
+            True si está conectado, False en caso contrario.
+        """
+        return self.client is not None
+
+
+    async def _post(self, payload: dict) -> dict:
+        """Envía una petición JSON-RPC respetando el límite de concurrencia."""
+        start = time.perf_counter()
+        async with self._semaphore:
+            wait = time.perf_counter() - start
+            self._in_use += 1
+            self._requests += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            try:
+                response = await self.client.post("/jsonrpc", json=payload)
+                response.raise_for_status()
+                return response.json()
+            finally:
+                self._in_use -= 1
+
+
+    async def _call(self, service: str, method: str, args: list):
+        """Llama a un servicio JSON-RPC de Odoo reintentando una vez ante errores de red."""
+        if self.client is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"service": service, "method": method, "args": args},
+            "id": next(self._request_ids),
+        }
+        try:
+            body = await self._post(payload)
+        except httpx.TransportError:
+            self._retries += 1
+            body = await self._post(payload)
+
+        if body.get("error"):
+            error = body["error"]
+            message = error.get("data", {}).get("message") or error.get("message")
+            raise OdooRPCError(message)
+        return body.get("result")
+
+
+    def get_pool_stats(self) -> dict:
+        """Devuelve las métricas de concurrencia del cliente.
+
+        Returns:
+            Diccionario con tamaño, peticiones en curso y disponibles, número de
+            peticiones, espera media y máxima (ms) y reintentos.
+        """
+        return {
+            "pool_size": self.pool_size,
+            "in_use": self._in_use,
+            "available": self.pool_size - self._in_use,
+            "checkouts": self._requests,
+            "avg_wait_ms": round(self._wait_total / self._requests * 1000, 3) if self._requests else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 3),
+            "retries": self._retries,
+        }
+
+
+    async def search_read(self, model, domain, fields, limit=0, offset=0, order=None):
+        """Ejecuta search_read en Odoo.
+
+        Args:
+            model: Nombre del modelo de Odoo.
+            domain: Filtros de búsqueda.
+            fields: Campos a recuperar.
+            limit: Número máximo de registros.
+            offset: Desplazamiento inicial.
+            order: Criterio de ordenación (ej. ``'id asc'``). Si es None, usa el del modelo.
+
+        Returns:
+            Lista de registros encontrados.
+        """
+        kwargs = {'fields': fields, 'limit': limit, 'offset': offset}
+        if order:
+            kwargs['order'] = order
+        return await self.execute_kw(model, 'search_read', [domain], kwargs)
+
+
+    async def execute_kw(self, model, method, args, kwargs=None):
+        """Ejecuta un método en un modelo de Odoo.
+
+        Args:
+            model: Nombre del modelo.
+            method: Nombre del método a ejecutar.
+            args: Argumentos posicionales.
+            kwargs: Argumentos con nombre.
+
+        Returns:
+            Resultado del método ejecutado.
+        """
+        return await self._call("object", "execute_kw", [
+            self.db, self.uid, self.password, model, method, args, kwargs or {}
+        ])
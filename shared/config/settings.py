@@ -9,6 +9,18 @@ class Settings(BaseSettings):
     ODOO_DB: str | None = None
     ODOO_USERNAME: str | None = None
     ODOO_PASSWORD: str | None = None
+    # Número de sesiones autenticadas en el pool de conexiones
+    ODOO_POOL_SIZE: int = 5
+    # Transporte: 'odoorpc' (cliente bloqueante en hilos) o 'jsonrpc' (httpx asíncrono)
+    ODOO_TRANSPORT: str = "odoorpc"
+
+    # Snapshot local de Odoo (si no se define ruta, se consulta siempre a Odoo)
+    ODOO_SNAPSHOT_PATH: str | None = None
+    ODOO_SNAPSHOT_MAX_AGE: int = 300
+
+    # Tipos de cambio a EUR: 'static' (tasas fijas), 'csv' (FX_RATES_PATH) u 'odoo' (res.currency.rate)
+    FX_RATES_SOURCE: str = "static"
+    FX_RATES_PATH: str | None = None
 
     # Mistral
     API_MISTRAL_KEY: str
@@ -0,0 +1,65 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+class PartnerAggregator:
+    """Acumula por partner las columnas derivadas de sus facturas limpias.
+
+    Permite calcular ``invoice_count``, ``invoice_ids`` y ``total_invoiced_eur``
+    a partir de varios lotes de facturas (ej. al limpiar en streaming) sin
+    guardar los lotes: solo se conservan los contadores, importes e ids de
+    cada partner. El resultado es el mismo que agregando todas las facturas
+    de una vez, salvo el redondeo de la suma de importes por lotes.
+
+    Attributes:
+        invoice_count (int): Número total de facturas acumuladas.
+    """
+
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self._totals: Dict[int, float] = {}
+        # Arrays de ids por lote, en orden de llegada
+        self._ids: Dict[int, List[np.ndarray]] = {}
+        self.invoice_count = 0
+
+    def update(self, invoices_df: pd.DataFrame) -> 'PartnerAggregator':
+        """Añade un lote de facturas limpias (con partner_id, id y amount_total_eur)."""
+        if invoices_df is None or invoices_df.empty:
+            return self
+        partner_ids = invoices_df['partner_id'].to_numpy(dtype=float, na_value=np.nan)
+        present = ~np.isnan(partner_ids)
+        partner_ids = partner_ids[present].astype(np.int64)
+        ids = invoices_df['id'].to_numpy(dtype=np.int64)[present]
+        amounts = pd.Series(invoices_df['amount_total_eur'].to_numpy(dtype=float)[present])
+
+        grouped = amounts.groupby(partner_ids, sort=False)
+        totals = grouped.sum()
+        for partner_id, rows in grouped.indices.items():
+            partner_id = int(partner_id)
+            self._counts[partner_id] = self._counts.get(partner_id, 0) + len(rows)
+            self._totals[partner_id] = self._totals.get(partner_id, 0.0) + totals[partner_id]
+            self._ids.setdefault(partner_id, []).append(ids[rows])
+        self.invoice_count += len(partner_ids)
+        return self
+
+    @property
+    def partner_ids(self) -> list:
+        """Partners con al menos una factura acumulada."""
+        return list(self._counts)
+
+    def invoice_ids(self, partner_id: int) -> list:
+        """IDs de las facturas acumuladas de un partner, en orden de llegada."""
+        chunks = self._ids.get(int(partner_id))
+        if not chunks:
+            return []
+        return np.concatenate(chunks).tolist()
+
+    def fill(self, partners_df: pd.DataFrame) -> pd.DataFrame:
+        """Rellena invoice_count, invoice_ids y total_invoiced_eur de ``partners_df`` (en el sitio)."""
+        df = partners_df
+        df['invoice_count'] = df['id'].map(self._counts).fillna(0).astype(int)
+        df['invoice_ids'] = [self.invoice_ids(pid) for pid in df['id']]
+        df['total_invoiced_eur'] = df['id'].map(self._totals).fillna(0)
+        return df
@@ -0,0 +1,75 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Grupo de las facturas sin valor en la columna de agrupación
+UNASSIGNED_GROUP = 'Sin asignar'
+
+
+def normalize_edges(edges: Sequence[int]) -> List[int]:
+    """Valida los límites de los buckets de aging (días) y añade el 0 inicial si falta.
+
+    Raises:
+        ValueError: Si los límites no son enteros no negativos estrictamente crecientes.
+    """
+    edges = [int(edge) for edge in edges]
+    if not edges or any(edge < 0 for edge in edges):
+        raise ValueError(f"Límites de aging no válidos: {edges}")
+    if any(b <= a for a, b in zip(edges, edges[1:])):
+        raise ValueError(f"Los límites de aging deben ser crecientes: {edges}")
+    if edges[0] != 0:
+        edges = [0] + edges
+    return edges
+
+
+def aging_buckets(edges: Sequence[int]) -> List[Tuple[str, int, Optional[int]]]:
+    """Devuelve los buckets definidos por ``edges`` como (etiqueta, día mínimo, día máximo).
+
+    Cada bucket cubre los días vencidos en ``(edges[i], edges[i + 1]]`` y el
+    último, los que superan ``edges[-1]`` (día máximo None). Con
+    ``[0, 30, 60, 90]``: ``0-30``, ``31-60``, ``61-90`` y ``>90``.
+    """
+    edges = normalize_edges(edges)
+    buckets = []
+    for i, (low, high) in enumerate(zip(edges, edges[1:])):
+        label = f"{low}-{high}" if i == 0 else f"{low + 1}-{high}"
+        buckets.append((label, low + 1, high))
+    buckets.append((f">{edges[-1]}", edges[-1] + 1, None))
+    return buckets
+
+
+def assign_buckets(days_overdue, edges: Sequence[int]) -> np.ndarray:
+    """Índice del bucket de cada factura según sus días vencidos (ver ``aging_buckets``)."""
+    upper = np.asarray(normalize_edges(edges)[1:])
+    return np.searchsorted(upper, np.asarray(days_overdue), side='left')
+
+
+def aggregate_aging(df: pd.DataFrame, edges: Sequence[int],
+                    group_col: str = None) -> Dict[Optional[str], Dict[str, Dict[str, float]]]:
+    """Cuenta facturas y suma ``amount_residual_eur`` por bucket (y grupo) de una vez.
+
+    Args:
+        df: Facturas vencidas con ``days_overdue`` y ``amount_residual_eur``.
+        edges: Límites de los buckets en días.
+        group_col: Columna por la que separar el aging (ej. ``currency_name``).
+            Si es None hay un único grupo con clave None; los valores nulos
+            se agrupan en ``UNASSIGNED_GROUP``.
+
+    Returns:
+        Diccionario {grupo: {etiqueta: {'count', 'amount'}}} con todos los
+        buckets de cada grupo, incluidos los vacíos, en orden.
+    """
+    labels = [label for label, _, _ in aging_buckets(edges)]
+    bucket = assign_buckets(df['days_overdue'].to_numpy(), edges)
+    keys = [bucket] if group_col is None else [df[group_col], bucket]
+    totals = df['amount_residual_eur'].groupby(keys, observed=True, dropna=False).agg(['size', 'sum'])
+
+    result: Dict[Optional[str], Dict[str, Dict[str, float]]] = {}
+    for key, row in totals.iterrows():
+        group, index = (None, key) if group_col is None else key
+        if group_col is not None and pd.isna(group):
+            group = UNASSIGNED_GROUP
+        buckets = result.setdefault(group, {label: {'count': 0, 'amount': 0.0} for label in labels})
+        buckets[labels[index]] = {'count': int(row['size']), 'amount': float(row['sum'])}
+    return result
@@ -0,0 +1,116 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import pandas as pd
+
+
+class DataFrameCache:
+    """Caché LRU con caducidad (TTL) y presupuesto de memoria para DataFrames.
+
+    Cada entrada caduca ``ttl`` segundos después de guardarse. Cuando se
+    supera ``max_entries`` o ``max_mb`` se expulsan las entradas usadas hace
+    más tiempo. Los DataFrames se devuelven sin copiar: quien los lea no
+    debe modificarlos.
+
+    Attributes:
+        ttl (float): Segundos de validez de cada entrada.
+        max_entries (int): Número máximo de entradas.
+        max_bytes (int): Memoria máxima ocupada por los DataFrames.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 1000, max_mb: float = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        # clave -> (DataFrame, tamaño en bytes, instante de expiración)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+
+        # Métricas
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """Devuelve el DataFrame de una clave, o None si no está o ha caducado."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        df, _size, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            self._expirations += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return df
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        """Guarda un DataFrame, expulsando las entradas menos recientes si hace falta.
+
+        Los DataFrames más grandes que todo el presupuesto no se guardan.
+        """
+        size = int(df.memory_usage(deep=True).sum())
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (df, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Elimina una entrada. Devuelve True si existía."""
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        self._invalidations += 1
+        return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Elimina las entradas cuya clave cumple ``predicate``. Devuelve cuántas."""
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            self._remove(key)
+        self._invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> int:
+        """Vacía la caché. Devuelve cuántas entradas se han eliminado."""
+        count = len(self._entries)
+        self._invalidations += count
+        self._entries.clear()
+        self._bytes = 0
+        return count
+
+    def _remove(self, key: Hashable) -> None:
+        _df, size, _expires_at = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_stats(self) -> dict:
+        """Devuelve las métricas de la caché.
+
+        Returns:
+            Diccionario con entradas, memoria ocupada (MB), aciertos, fallos,
+            tasa de aciertos, caducadas, expulsadas e invalidadas.
+        """
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": round(self._bytes / (1024 * 1024), 3),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 3),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "expirations": self._expirations,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+        }
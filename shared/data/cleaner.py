@@ -1,7 +1,17 @@
+import asyncio
+import importlib.util
 import pandas as pd
 import numpy as np
-from typing import Tuple
+from typing import AsyncIterator, Iterable, Iterator, Tuple
 
+from .aggregates import PartnerAggregator
+from .dates import DateParser
+from .rates import RateTable
+from .config import (
+    COMPACT_DTYPES, CLEAN_INVOICE_DTYPES, ARROW_STRINGS, CLEAN_INVOICE_STRING_COLUMNS
+)
+
+# Tasas fijas (EUR por unidad) usadas si no se carga una tabla de tipos de cambio
 RATES = {
     'MXN': 0.048, 
     'USD': 0.92,   
@@ -30,10 +40,14 @@ class DataCleaner:
         # Configuración para limpieza de estados de pago
         self.partial_to_paid_threshold = 0.5
 
-        self._currency_rates = RATES
+        # Tipos de cambio a EUR con fecha de efecto (por defecto, las tasas fijas de RATES)
+        self.rate_table = RateTable.from_static(RATES)
         # Umbral máximo de importe para filtrar facturas erróneas
         self.max_invoice_amount_eur = 1_000_000
 
+        # Formato de fecha detectado una vez por campo
+        self._date_parser = DateParser()
+
     def clean_raw_data(self, invoices_df: pd.DataFrame, 
                        partners_df: pd.DataFrame = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Limpia los datos recibidos de la base de datos.
@@ -53,6 +67,160 @@ class DataCleaner:
         return invoices_cleaned, partners_cleaned
 
 
+    # =========================================================================
+    # LIMPIEZA EN STREAMING
+    # =========================================================================
+
+    def clean_stream(self, batches: Iterable,
+                     aggregator: PartnerAggregator = None) -> Iterator[pd.DataFrame]:
+        """Limpia facturas por lotes, devolviendo cada lote limpio según llega.
+
+        Cada lote (lista de registros raw de Odoo o DataFrame, ej. una página de
+        ``DataRetriever.iter_outbound_invoice_pages``) se limpia por separado,
+        por lo que la memoria máxima depende del tamaño del lote y no del total.
+        Todos los filtros de ``_clean_invoices`` son por fila (incluida la
+        exclusión de clientes por nombre) y el formato de fechas se detecta con
+        el primer lote y se reutiliza en los siguientes, así que concatenar los
+        lotes da el mismo resultado que limpiarlos juntos (salvo el índice, que
+        empieza en 0 en cada lote, y las categorías, que son las de cada lote:
+        usar ``apply_schema`` tras concatenar).
+
+        Args:
+            batches (Iterable): Lotes de registros raw de facturas.
+            aggregator (PartnerAggregator, optional): Acumula los agregados por
+                partner de los lotes limpios; después se pasa a ``clean_partners``.
+
+        Yields:
+            pd.DataFrame: Facturas limpias de cada lote no vacío.
+        """
+        for batch in batches:
+            cleaned = self._clean_batch(batch, aggregator)
+            if cleaned is not None:
+                yield cleaned
+
+
+    async def aclean_stream(self, batches: AsyncIterator,
+                            aggregator: PartnerAggregator = None) -> AsyncIterator[pd.DataFrame]:
+        """Versión asíncrona de ``clean_stream`` que solapa la limpieza con la descarga.
+
+        Mientras un lote se limpia en un hilo aparte, ya se está pidiendo el
+        siguiente a ``batches``; como mucho hay un lote en limpieza y otro en
+        descarga a la vez.
+
+        Args:
+            batches (AsyncIterator): Lotes de registros raw de facturas.
+            aggregator (PartnerAggregator, optional): Ver ``clean_stream``.
+
+        Yields:
+            pd.DataFrame: Facturas limpias de cada lote no vacío.
+        """
+        iterator = batches.__aiter__()
+        pending = asyncio.ensure_future(anext(iterator))
+        try:
+            while True:
+                try:
+                    batch = await pending
+                except StopAsyncIteration:
+                    return
+                pending = asyncio.ensure_future(anext(iterator))
+                cleaned = await asyncio.to_thread(self._clean_batch, batch, aggregator)
+                if cleaned is not None:
+                    yield cleaned
+        finally:
+            if not pending.done():
+                pending.cancel()
+
+
+    def clean_partners(self, partners_df: pd.DataFrame,
+                       aggregator: PartnerAggregator) -> pd.DataFrame:
+        """Limpia los partners usando los agregados acumulados durante el streaming.
+
+        Equivale al DataFrame de partners de ``clean_raw_data`` con todas las
+        facturas de los lotes.
+        """
+        return self._clean_partners(partners_df=partners_df, aggregator=aggregator)
+
+
+    def _clean_batch(self, batch, aggregator: PartnerAggregator = None) -> pd.DataFrame | None:
+        """Limpia un lote de ``clean_stream`` y lo añade al agregador. None si queda vacío."""
+        df = batch if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch)
+        if df.empty:
+            return None
+        cleaned = self._clean_invoices(df)
+        if cleaned.empty:
+            return None
+        if aggregator is not None:
+            aggregator.update(cleaned)
+        return cleaned
+
+
+    def clean_incremental(self, invoices_df: pd.DataFrame, delta_df: pd.DataFrame,
+                          deleted_ids: list = None,
+                          partners_df: pd.DataFrame = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Actualiza unas facturas ya limpias con un delta de registros raw de Odoo.
+
+        Solo se limpian las facturas nuevas o modificadas de ``delta_df``; sus
+        versiones anteriores y las de ``deleted_ids`` se eliminan del DataFrame
+        limpio. Si se pasa ``partners_df`` (limpio), sus columnas derivadas se
+        recalculan únicamente para los partners afectados. El coste es
+        proporcional al número de cambios, no al tamaño de la cartera.
+
+        Args:
+            invoices_df (pd.DataFrame): Facturas limpias previas (de ``clean_raw_data``).
+            delta_df (pd.DataFrame): Registros raw de Odoo nuevos o modificados.
+            deleted_ids (list, optional): IDs de facturas eliminadas o que ya no aplican.
+            partners_df (pd.DataFrame, optional): Partners limpios previos.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: Facturas limpias actualizadas (ordenadas
+            por id) y partners actualizados (None si no se pasaron).
+        """
+        has_delta = delta_df is not None and not delta_df.empty
+        stale_ids = set(deleted_ids or [])
+        if has_delta:
+            stale_ids |= set(delta_df['id'].tolist())
+
+        if invoices_df is None or invoices_df.empty:
+            kept, removed = pd.DataFrame(), pd.DataFrame()
+        else:
+            stale = invoices_df['id'].isin(stale_ids)
+            kept, removed = self._keep_rows(invoices_df, ~stale), invoices_df[stale]
+
+        added = self._clean_invoices(delta_df) if has_delta else pd.DataFrame()
+
+        frames = [f for f in (kept, added) if not f.empty]
+        if frames:
+            df = pd.concat(frames, ignore_index=True).sort_values('id', kind='stable')
+            df.index = pd.RangeIndex(len(df))
+            df = self.apply_schema(df)
+        else:
+            df = pd.DataFrame()
+
+        if partners_df is not None and not partners_df.empty:
+            affected = set()
+            for frame in (removed, added):
+                if not frame.empty:
+                    affected |= set(frame['partner_id'].dropna().astype(int).tolist())
+            if affected:
+                partners_df = self._update_invoice_info(partners_df, df, affected)
+
+        return df, partners_df
+
+
+    def _update_invoice_info(self, partners_df: pd.DataFrame, invoices_df: pd.DataFrame,
+                             partner_ids: set) -> pd.DataFrame:
+        """Recalcula las columnas derivadas de ``_fill_invoice_info`` solo para ``partner_ids``."""
+        rows = partners_df['id'].isin(partner_ids)
+        if not rows.any():
+            return partners_df
+        if invoices_df.empty:
+            invoices_df = pd.DataFrame(columns=['id', 'partner_id', 'amount_total_eur'])
+        affected_invoices = invoices_df[invoices_df['partner_id'].isin(partner_ids)]
+        updated = self._fill_invoice_info(self._keep_rows(partners_df, rows), affected_invoices)
+        # Mantener el orden original de los partners
+        return pd.concat([partners_df[~rows], updated]).sort_index()
+
+
     def _clean_invoices(self, invoices_df: pd.DataFrame) -> pd.DataFrame:
         """Limpia los datos de facturas.
         
@@ -61,89 +229,142 @@ class DataCleaner:
             2. Separa campos ``*_id`` en dos columnas (id y name).
             3. Limpia estados de pago (paid, partial, not_paid).
             4. Elimina facturas con amount_total == 0.
-            5. Convierte amount_total y amount_residual a EUR.
-            6. Limpia y procesa fechas de pago, convierte a datetime y elimina filas sin fecha.
-            7. Elimina facturas de marketplace.
+            5. Limpia y procesa fechas de pago, convierte a datetime y elimina filas sin fecha.
+            6. Convierte amount_total y amount_residual a EUR y elimina outliers.
+            7. Elimina facturas de marketplace (antes de parsear fechas).
+
+        El DataFrame de entrada se copia una sola vez; los pasos trabajan sobre
+        esa copia en el sitio. Las filas descartadas se acumulan en una máscara
+        que se aplica antes de parsear fechas (el paso más caro) y otra vez al
+        final con los filtros que dependen de las fechas y de los importes en EUR.
         """
         if invoices_df is None:
             return pd.DataFrame()
         df = invoices_df.copy()
 
         # Convertir datos faltantes de Odoo a NaN
-        df = self._odoo_missing_values_to_null(df)
+        self._odoo_missing_values_to_null(df)
 
         # Convertir campos *_id en dos columnas separadas
-        df = self._split_id_name_fields(df)
+        self._split_id_name_fields(df)
 
-        # Procesar estados de pago
-        df = self._clean_payment_state(df)
+        # Procesar estados de pago (descarta las 'reversed')
+        keep = self._clean_payment_state(df)
 
         # Eliminar facturas con amount_total == 0
-        df = df[df['amount_total'] != 0]
+        keep &= df['amount_total'] != 0
 
         # Drop filas sin nombre de factura / partner
-        df = df.dropna(subset=['name', 'partner_name'])
+        keep &= df['name'].notna() & df['partner_name'].notna()
 
-        # Convertir amount_total a EUR
-        df = self._convert_amounts_to_eur(df)
+        # Eliminar facturas pagadas sin fecha de pago
+        keep &= ~(df['payment_dates'].isna() & (df['payment_state'] == 'paid'))
 
-        # Outliers
-        df = df[df['amount_total_eur'] <= self.max_invoice_amount_eur]
+        # Eliminar facturas de marketplace (no aportan información relevante)
+        keep &= ~df['partner_name'].str.contains(self.clients_to_exclude, na=False)
+
+        # Las fechas solo se parsean en las filas que siguen
+        df = self._keep_rows(df, keep)
 
         # Limpiar y procesar fechas de pago
-        df = self._clean_payment_dates(df)
+        self._clean_payment_dates(df)
         # NO hacer dropna de payment_dates, las impagadas no tienen fecha de pago
 
         # Convertir columnas de fecha a datetime y eliminar filas sin fecha
         date_cols = df.columns[
             df.columns.str.contains('date') & ~df.columns.str.contains('payment_dates')
         ].tolist()
-        df = self._convert_to_datetime(df, date_cols)
-        df = df.dropna(subset=['invoice_date', 'invoice_date_due'])
+        self._convert_to_datetime(df, date_cols)
+        keep = df['invoice_date'].notna() & df['invoice_date_due'].notna()
+
+        # Convertir amount_total a EUR (tasa vigente en la fecha de factura)
+        self._convert_amounts_to_eur(df)
+
+        # Outliers
+        keep &= df['amount_total_eur'] <= self.max_invoice_amount_eur
+
+        df = self._keep_rows(df, keep)
+        df.index = pd.RangeIndex(len(df))
+        return self.apply_schema(df)
 
-        # Eliminar facturas de marketplace (no aportan información relevante)
-        df = df[~df['partner_name'].str.contains(self.clients_to_exclude, na=False)]
 
-        return df.reset_index(drop=True)
+    def apply_schema(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convierte en el sitio un DataFrame de facturas limpias al esquema compacto.
+
+        Usa los tipos de ``CLEAN_INVOICE_DTYPES`` (ids ``Int32``, categorías para
+        textos repetidos) y, si ``ARROW_STRINGS`` está activo y pyarrow instalado,
+        ``string[pyarrow]`` para ``CLEAN_INVOICE_STRING_COLUMNS``. Es idempotente:
+        se puede volver a aplicar tras concatenar DataFrames ya limpios.
+
+        Args:
+            df (pd.DataFrame): Facturas limpias.
+
+        Returns:
+            pd.DataFrame: El mismo DataFrame con los tipos compactos.
+        """
+        if not COMPACT_DTYPES or df.empty:
+            return df
+        for col, dtype in CLEAN_INVOICE_DTYPES.items():
+            if col in df.columns and df[col].dtype != dtype:
+                df[col] = df[col].astype(dtype)
+        if ARROW_STRINGS and importlib.util.find_spec('pyarrow') is not None:
+            for col in CLEAN_INVOICE_STRING_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].astype('string[pyarrow]')
+        return df
+
+
+    def _keep_rows(self, df: pd.DataFrame, mask: pd.Series) -> pd.DataFrame:
+        """Devuelve las filas que cumplen ``mask`` como un DataFrame independiente.
+
+        A diferencia de ``df[mask]``, el resultado no queda marcado como vista
+        de ``df``, por lo que los pasos siguientes pueden modificarlo en el sitio.
+        """
+        return df.take(np.flatnonzero(mask.to_numpy()))
 
 
     def _clean_partners(self, partners_df: pd.DataFrame, 
-                        invoices_df: pd.DataFrame = None) -> pd.DataFrame:
+                        invoices_df: pd.DataFrame = None,
+                        aggregator: PartnerAggregator = None) -> pd.DataFrame:
         """Limpia los datos de partners.
 
         Pasos realizados:
             1. Convierte datos faltantes de Odoo a NaN.
             2. Solo conserva clientes que son empresas.
             3. Separa campos ``*_id`` en dos columnas (id y name).
-            4. Rellena invoices_ids y columnas derivadas.
+            4. Rellena invoices_ids y columnas derivadas (de ``invoices_df`` o,
+               si se limpió en streaming, de ``aggregator``).
         """
         if partners_df is None:
             return pd.DataFrame()
         df = partners_df.copy()
 
         # Convertir datos faltantes de Odoo a NaN
-        df = self._odoo_missing_values_to_null(df)
+        self._odoo_missing_values_to_null(df)
 
         # Solo conservar clientes que son empresas
-        df = df[df['company_type'] == 'company']
-        df = df.drop(columns=['company_type'], errors='ignore')
+        df = self._keep_rows(df, df['company_type'] == 'company')
+        df.drop(columns=['company_type'], errors='ignore', inplace=True)
 
         # Extraer datos de columnas *_id
-        df = self._split_id_name_fields(df)
-        df = df.drop(columns=['country_id'], errors='ignore')
+        self._split_id_name_fields(df)
+        df.drop(columns=['country_id'], errors='ignore', inplace=True)
 
         # Actualizar invoices_ids y columnas derivadas
-        if invoices_df is not None:
-            df = self._fill_invoice_info(partners_df=df, invoices_df=invoices_df)
+        if aggregator is not None:
+            aggregator.fill(df)
+        elif invoices_df is not None:
+            self._fill_invoice_info(partners_df=df, invoices_df=invoices_df)
 
-        return df.reset_index(drop=True)
+        df.index = pd.RangeIndex(len(df))
+        return df
 
 
     def _fill_invoice_info(self, partners_df: pd.DataFrame, 
                            invoices_df: pd.DataFrame) -> pd.DataFrame:
-        """Rellena las columnas invoice_count, invoice_ids y total_invoiced_eur.
+        """Rellena las columnas invoice_count, invoice_ids y total_invoiced_eur (en el sitio).
         """
-        df = partners_df.copy()
+        df = partners_df
         invoice_counts = invoices_df.groupby('partner_id').size().to_dict()
         
         df['invoice_count'] = df['id'].map(invoice_counts).fillna(0).astype(int)
@@ -160,32 +381,41 @@ class DataCleaner:
     def _odoo_missing_values_to_null(self, df: pd.DataFrame) -> pd.DataFrame:
         """Convierte los valores que Odoo usa para representar datos faltantes a NaN.
         Estos incluyen False, cadenas vacías, '/' (nombre de facturas) y listas vacías.
+        Modifica ``df`` en el sitio.
         """
-        df = df.copy()
+        # Una columna sin ningún valor llega como bool (todo False): también es vacía
+        bool_cols = df.select_dtypes(include='bool').columns
+        df[bool_cols] = df[bool_cols].astype(object)
         object_cols = df.select_dtypes(include='object').columns
         
         df[object_cols] = df[object_cols].replace({False: np.nan, '': np.nan, '/': np.nan})
         
         for col in object_cols:
-            df[col] = df[col].apply(lambda x: np.nan if isinstance(x, list) and len(x) == 0 else x)
+            values = df[col]
+            is_list = values.map(type) == list
+            if is_list.any():
+                empty = pd.Series(False, index=values.index)
+                empty[is_list] = values[is_list].map(len) == 0
+                values = values.mask(empty)
+            # Reinferir el tipo igual que lo haría un apply celda a celda
+            df[col] = values.infer_objects()
         
         return df
 
 
-    def _convert_to_datetime(self, df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    def _convert_to_datetime(self, df: pd.DataFrame, columns: list,
+                             first_token: bool = False) -> pd.DataFrame:
         """Convierte las columnas especificadas a tipo datetime.
-        Soporta formatos con '/' (dd/mm/yyyy) y otros formatos estándar.
+        Soporta formatos con '/' (dd/mm/yyyy) y otros formatos estándar; el
+        formato de cada campo se detecta una vez y se reutiliza (ver :class:`DateParser`).
+        Con ``first_token`` solo se usa la primera fecha de listas separadas por comas.
+        Modifica ``df`` en el sitio.
         """
-        df = df.copy()
         for col in columns:
             if col not in df.columns:
                 continue
             try:
-                # Formato raro que usa la empresa
-                if df[col].astype(str).str.contains('/').any():
-                    df[col] = pd.to_datetime(df[col], errors='coerce', format='%d/%m/%Y')
-                else:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
+                df[col] = self._date_parser.parse(df[col], col, first_token=first_token)
             except Exception as e:
                 print(f"Error al convertir '{col}': {e}")
         return df
@@ -193,92 +423,134 @@ class DataCleaner:
 
     def _split_id_name_fields(self, df: pd.DataFrame) -> pd.DataFrame:
         """Encuentra campos que son tuplas (id, nombre) y los separa en dos columnas.
+        Modifica ``df`` en el sitio.
         """
-        df = df.copy()
         id_name_fields = df.columns[df.columns.str.endswith('_id')].tolist()
         
         for field in id_name_fields:
             base_name = field[:-3]
-            
-            df[base_name + '_name'] = df[field].apply(
-                lambda x: x[1] if isinstance(x, (list, tuple)) and len(x) == 2 else np.nan
-            )
-            df[field] = df[field].apply(
-                lambda x: x[0] if isinstance(x, (list, tuple)) and len(x) == 2 else np.nan
-            )
+            values = df[field]
+
+            # Solo los pares (id, nombre); el resto queda como NaN
+            is_pair = values.map(type).isin([list, tuple])
+            if is_pair.any():
+                is_pair[is_pair] = values[is_pair].map(len) == 2
+
+            ids = np.full(len(df), np.nan, dtype=object)
+            names = np.full(len(df), np.nan, dtype=object)
+            if is_pair.any():
+                pairs = np.empty((int(is_pair.sum()), 2), dtype=object)
+                pairs[:] = values[is_pair].tolist()
+                ids[is_pair.to_numpy()] = pairs[:, 0]
+                names[is_pair.to_numpy()] = pairs[:, 1]
+
+            df[base_name + '_name'] = pd.Series(names, index=df.index).infer_objects()
+            df[field] = pd.Series(ids, index=df.index).infer_objects()
             
         return df
 
 
-    def _clean_payment_state(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Limpia las facturas según su estado de pago.
+    def _clean_payment_state(self, df: pd.DataFrame) -> pd.Series:
+        """Limpia las facturas según su estado de pago (en el sitio).
 
         Acciones:
-        - Elimina facturas 'reversed'.
+        - Marca para eliminar las facturas 'reversed'.
         - Convierte 'in_payment' a 'paid'.
         - Convierte 'partial' a 'not_paid' o 'paid' (según el residual).
-        """
-        df = df.copy()
 
-        df = df[df['payment_state'] != 'reversed']  
+        Returns:
+            pd.Series: Máscara con las facturas que se conservan (no 'reversed').
+        """
+        keep = df['payment_state'] != 'reversed'
         df['payment_state'] = df['payment_state'].replace('in_payment', 'paid')
-        df = self._fix_partial_to_paid_invoices(df)
+        self._fix_partial_to_paid_invoices(df)
         df['payment_state'] = df['payment_state'].replace('partial', 'not_paid')
 
-        return df
+        return keep
 
 
     def _fix_partial_to_paid_invoices(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Ajusta estado de pago de facturas parciales a pagadas si residual < umbral.
+        """Ajusta estado de pago de facturas parciales a pagadas si residual < umbral (en el sitio).
         """
-        df = df.copy()
         mask = (df['payment_state'] == 'partial') & (df['amount_residual'] < self.partial_to_paid_threshold)
         df.loc[mask, 'payment_state'] = 'paid'
         return df
 
 
     def _convert_amounts_to_eur(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Convierte los montos a EUR usando las tasas de cambio disponibles.
+        """Convierte los montos a EUR usando las tasas de cambio disponibles (en el sitio).
+
+        Usa la tasa vigente en ``invoice_date`` de cada factura (ver :class:`RateTable`);
+        las monedas sin tasa (y EUR) se dejan igual.
         """
-        df = df.copy()
-    
-        df['amount_total_eur'] = df.apply(lambda row: self._convert_to_eur(row, 'amount_total'), axis=1)
-        df['amount_residual_eur'] = df.apply(lambda row: self._convert_to_eur(row, 'amount_residual'), axis=1)
+        if 'currency_name' in df.columns:
+            rate = self.rate_table.rate_at(df['currency_name'], df.get('invoice_date'))
+        else:
+            rate = np.full(len(df), np.nan)
+        rate = pd.Series(rate, index=df.index)
+        has_rate = rate.notna()
+
+        for amount_col in ['amount_total', 'amount_residual']:
+            amounts = df[amount_col]
+            if has_rate.any():
+                amounts = amounts.where(~has_rate, amounts * rate)
+            df[amount_col + '_eur'] = amounts
         
         return df
 
-    def _convert_to_eur(self, row, amount_col):
-        """Convierte un monto específico a EUR según la moneda indicada en la fila.
+    def convert_amount_to_eur(self, amount: float, currency: str) -> float:
+        """Convierte un importe a EUR con la última tasa conocida. Las monedas sin tasa se dejan igual.
         """
-        currency = row.get('currency_name', 'EUR')
-        amount = row[amount_col]
-        if currency != 'EUR' and currency in self._currency_rates:
-            return amount * self._currency_rates[currency]
+        rate = self.rate_table.latest(currency) if currency != 'EUR' else None
+        if rate is not None:
+            return amount * rate
         return amount
 
+    def unpaid_invoices_domain(self) -> list:
+        """Dominio de Odoo equivalente a la limpieza de facturas pendientes.
+
+        Permite agregar en el servidor (``read_group``) las mismas facturas que
+        quedarían como ``not_paid`` tras ``clean_raw_data``: excluye parciales
+        con residual bajo, importes cero, facturas sin nombre, partner o fechas,
+        outliers por importe en EUR y clientes excluidos. Los outliers se
+        calculan con la última tasa de cada moneda, así que el dominio solo es
+        equivalente con tasas fijas (``RateTable.is_static``).
+
+        Returns:
+            list: Dominio en notación polaca de Odoo.
+        """
+        # Outliers: amount_total * tasa <= máximo, expresado por moneda (con la última tasa)
+        known = self.rate_table.currencies
+        cap_terms = [
+            ['&', ('currency_id.name', '=', currency),
+             ('amount_total', '<=', self.max_invoice_amount_eur / self.rate_table.latest(currency))]
+            for currency in known
+        ]
+        cap_terms.append(['&', ('currency_id.name', 'not in', known),
+                          ('amount_total', '<=', self.max_invoice_amount_eur)])
+
+        domain = [
+            '|', ('payment_state', '=', 'not_paid'),
+            '&', ('payment_state', '=', 'partial'),
+            ('amount_residual', '>=', self.partial_to_paid_threshold),
+            ('amount_total', '!=', 0),
+            ('name', '!=', False), ('name', '!=', '/'),
+            ('partner_id', '!=', False),
+            ('partner_id.name', 'not like', self.clients_to_exclude),
+            ('invoice_date', '!=', False),
+            ('invoice_date_due', '!=', False),
+        ]
+        domain += ['|'] * (len(cap_terms) - 1)
+        for term in cap_terms:
+            domain += term
+        return domain
+
     def _clean_payment_dates(self, df: pd.DataFrame) -> pd.DataFrame:
         """Limpia y procesa las fechas de pago.
         
-        Acciones:
-        - Elimina facturas 'paid' sin fecha.
+        Acciones (en el sitio; las facturas 'paid' sin fecha se descartan antes):
         - Conserva solo la primera fecha si hay múltiples.
         - Convierte a datetime.
         """
-        df = df.copy()
-        
-        paid_without_date = (df['payment_dates'].isna()) & (df['payment_state'] == 'paid')
-        df = df[~paid_without_date]
-        
-        has_date = df['payment_dates'].notna()
-        
-        df.loc[has_date, 'payment_dates'] = (
-            df.loc[has_date, 'payment_dates']
-            .astype(str)
-            .str.split(r",\s*")
-            .str[0]
-        )
-
-        df['payment_dates'] = df['payment_dates'].replace('nan', np.nan)
-        
-        df = self._convert_to_datetime(df, ['payment_dates'])
+        self._convert_to_datetime(df, ['payment_dates'], first_token=True)
         return df
@@ -11,3 +11,79 @@ INVOICE_FIELDS = [
 ]
 
 BATCH_SIZE = 500
+
+# Campos de res.currency.rate para la tabla de tipos de cambio con fecha
+RATE_FIELDS = ['name', 'currency_id', 'rate', 'company_id']
+# Campos de res.company para saber en qué moneda expresa cada compañía sus tasas
+COMPANY_FIELDS = ['id', 'currency_id']
+
+# Esquema compacto de las facturas limpias (lo aplica DataCleaner y lo reutiliza DataManager):
+# ids como enteros nulables de 32 bits y textos de baja cardinalidad como categorías.
+# Los importes se mantienen en float64: float32 no representa céntimos con exactitud.
+COMPACT_DTYPES = True
+CLEAN_INVOICE_DTYPES = {
+    'id': 'Int32',
+    'partner_id': 'Int32',
+    'company_id': 'Int32',
+    'currency_id': 'Int32',
+    'move_type': 'category',
+    'payment_state': 'category',
+    'currency_name': 'category',
+    'company_name': 'category',
+    'partner_name': 'category',
+}
+# Textos de alta cardinalidad que pasan a string[pyarrow] si ARROW_STRINGS y pyarrow está instalado
+ARROW_STRINGS = False
+CLEAN_INVOICE_STRING_COLUMNS = ['name']
+
+# Paginación de descargas completas:
+# - 'offset': search_count y exactamente las páginas limit/offset necesarias en paralelo
+# - 'keyset': search_count y páginas por id (id > último id) en rangos de ids disjuntos en paralelo
+PAGINATION_MODE = 'keyset'
+
+# Agregar en Odoo (read_group) los informes globales de deuda en vez de descargar facturas
+SERVER_SIDE_AGGREGATION = True
+
+# Consultas "top N" ordenadas en Odoo: se piden N * factor facturas por si la limpieza descarta alguna
+TOP_N_OVERFETCH_FACTOR = 2
+
+# Caché de facturas limpias por cliente (partner_id, cutoff): validez, entradas y memoria máximas
+CLIENT_CACHE_TTL = 300
+CLIENT_CACHE_MAX_ENTRIES = 1000
+CLIENT_CACHE_MAX_MB = 128
+
+# Segundos entre refrescos incrementales del libro completo de facturas limpias en DataManager
+BOOK_REFRESH_INTERVAL = 60
+
+# Tabla materializada de estadísticas por partner (DataManager): meses del período
+# reciente de la tendencia de pago. Se refresca junto con el libro (BOOK_REFRESH_INTERVAL)
+PARTNER_STATS_RECENT_MONTHS = 6
+
+# Índice local de búsqueda de partners por nombre (DataManager): segundos entre recargas
+# y similitud mínima (0-1) de los resultados aproximados por trigramas
+PARTNER_INDEX_REFRESH_INTERVAL = 300
+PARTNER_SEARCH_MIN_SIMILARITY = 0.45
+
+# Operaciones por cliente/factura en paralelo (DataManager): concurrencia máxima y
+# timeout por tarea en segundos
+FAN_OUT_CONCURRENCY = 5
+FAN_OUT_TIMEOUT = 60
+
+# Límites (días vencidos) de los buckets del aging report: 0-30, 31-60, 61-90 y >90
+AGING_BUCKET_EDGES = [0, 30, 60, 90]
+# Columnas por las que se puede desglosar el aging
+AGING_GROUP_COLUMNS = {'company': 'company_name', 'currency': 'currency_name'}
+
+# Modelos replicados en el snapshot local: dominio base de sincronización, campos
+# y campos indexados en memoria (las consultas por '=' o 'in' no recorren todo)
+SNAPSHOT_MODELS = {
+    'account.move': {
+        'domain': [('move_type', '=', 'out_invoice')],
+        'fields': INVOICE_FIELDS,
+        'index': ['partner_id'],
+    },
+    'res.partner': {
+        'domain': [('customer_rank', '>', '0')],
+        'fields': PARTNER_FIELDS,
+    },
+}
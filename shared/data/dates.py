@@ -0,0 +1,80 @@
+from typing import Dict, Optional
+
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# Formato con '/' que usa la empresa en algunos campos
+SLASH_DATE_FORMAT = '%d/%m/%Y'
+
+
+class DateParser:
+    """Convierte columnas de fechas de Odoo a datetime con un formato fijo por campo.
+
+    El formato de cada campo se detecta la primera vez que llegan valores
+    (``'%d/%m/%Y'`` si alguno contiene ``'/'``; si no, el que deduce pandas del
+    primer valor) y se guarda para las siguientes llamadas, de modo que no
+    hay que volver a inspeccionar la columna y el parseo siempre usa un
+    formato explícito.
+
+    Attributes:
+        formats (dict): Formato detectado por campo (None si pandas no lo deduce).
+    """
+
+    def __init__(self):
+        self.formats: Dict[str, Optional[str]] = {}
+
+    def detect_format(self, field: str, values: pd.Series) -> Optional[str]:
+        """Detecta y guarda el formato de un campo a partir de sus valores.
+
+        Args:
+            field: Nombre del campo de origen.
+            values: Valores de texto del campo (pueden incluir nulos).
+
+        Returns:
+            Formato ``strftime`` detectado, o None si no se puede deducir.
+        """
+        if field in self.formats:
+            return self.formats[field]
+        present = values.dropna()
+        if present.empty:
+            # Sin valores no se puede detectar: se intentará en la siguiente llamada
+            return None
+
+        present = present.astype(str)
+        if present.str.contains('/', regex=False).any():
+            fmt = SLASH_DATE_FORMAT
+        else:
+            fmt = guess_datetime_format(present.iloc[0].split(',')[0].strip())
+        self.formats[field] = fmt
+        return fmt
+
+    def parse(self, values: pd.Series, field: str, first_token: bool = False) -> pd.Series:
+        """Convierte una columna a datetime con el formato del campo.
+
+        Args:
+            values: Columna de texto.
+            field: Nombre del campo de origen (clave de la caché de formatos).
+            first_token: Si True, los valores pueden ser listas separadas por
+                comas (ej. ``payment_dates``) y solo se usa la primera fecha.
+
+        Returns:
+            Serie datetime; los valores no válidos quedan como NaT.
+        """
+        fmt = self.detect_format(field, values)
+        if fmt is None:
+            if first_token and values.notna().any():
+                values = values.astype(str).where(values.notna()).str.split(',', n=1).str[0]
+            return pd.to_datetime(values, errors='coerce')
+        # Con exact=False el formato se busca dentro del texto: toma la primera fecha
+        return pd.to_datetime(values, format=fmt, exact=not first_token, errors='coerce')
+
+    def reset(self, field: str = None) -> None:
+        """Olvida el formato detectado de un campo (o de todos)."""
+        if field is None:
+            self.formats.clear()
+        else:
+            self.formats.pop(field, None)
@@ -1,14 +1,33 @@
+import asyncio
+import time
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 
 from shared.clients.odoo_connector import OdooConnection
+from shared.clients.odoo_jsonrpc import AsyncOdooConnection
+from shared.config.settings import settings
 from .retriever import DataRetriever
-from .cleaner import DataCleaner
+from .cleaner import DataCleaner, RATES
+from .rates import RateTable
+from .snapshot import SnapshotStore
+from .cache import DataFrameCache
+from .partner_stats import PartnerStatsTable
+from .search_index import PartnerSearchIndex
+from .summaries import amount_by_state, build_invoice_summaries, days_overdue_at
+from shared.utils.fan_out import FanOutResult, fan_out
+from .config import (
+    SERVER_SIDE_AGGREGATION, TOP_N_OVERFETCH_FACTOR,
+    CLIENT_CACHE_TTL, CLIENT_CACHE_MAX_ENTRIES, CLIENT_CACHE_MAX_MB,
+    BOOK_REFRESH_INTERVAL, AGING_BUCKET_EDGES, AGING_GROUP_COLUMNS,
+    FAN_OUT_CONCURRENCY, FAN_OUT_TIMEOUT, PARTNER_STATS_RECENT_MONTHS, PARTNER_INDEX_REFRESH_INTERVAL
+)
+from .aging import UNASSIGNED_GROUP, aggregate_aging, aging_buckets, normalize_edges
 from shared.models.domain import (
     ClientSearchResult, ClientInfo, InvoiceSummary,
     PredictionResult, RiskCategory, PaymentState,
     AgingReport, PortfolioSummary, ClientTrend,
-    DeterioratingClient, AgingBucket
+    DeterioratingClient, AgingBucket, AgingGroup, AgingGroupBy
 )
 
 
@@ -29,27 +48,259 @@ class DataManager:
         self.cutoff_ts = pd.Timestamp(self.cutoff)
 
         # Conexión a Odoo
-        self.odoo_connection: Optional[OdooConnection] = None
+        self.odoo_connection: Optional[OdooConnection | AsyncOdooConnection] = None
         self.data_retriever: Optional[DataRetriever] = None
 
         # Limpieza de datos
         self._cleaner: DataCleaner = DataCleaner()
 
+        # Caché de facturas limpias por (partner_id, cutoff)
+        self._client_cache = DataFrameCache(
+            ttl=CLIENT_CACHE_TTL,
+            max_entries=CLIENT_CACHE_MAX_ENTRIES,
+            max_mb=CLIENT_CACHE_MAX_MB
+        )
+
+        # Libro completo de facturas limpias, refrescado de forma incremental
+        self._book_df: Optional[pd.DataFrame] = None
+        self._book_watermark: Optional[Tuple[str, int]] = None
+        self._book_refreshed_at = 0.0
+        self._book_lock = asyncio.Lock()
+
+        # Estadísticas materializadas por partner, actualizadas con cada refresco del libro
+        self._partner_stats: Optional[PartnerStatsTable] = None
+
+        # Índice local de nombres de clientes para search_clients
+        self._partner_index: Optional[PartnerSearchIndex] = None
+        self._partner_index_refreshed_at = 0.0
+        self._partner_index_task: Optional[asyncio.Task] = None
+
     async def connect(self) -> None:
-        """Establece la conexión con Odoo."""
-        self.odoo_connection = OdooConnection()
+        """Establece la conexión con Odoo.
+
+        Si ``ODOO_SNAPSHOT_PATH`` está definido, carga el snapshot local y lo
+        sincroniza con Odoo antes de empezar a servir consultas.
+        """
+        if settings.ODOO_TRANSPORT == "jsonrpc":
+            self.odoo_connection = AsyncOdooConnection()
+        else:
+            self.odoo_connection = OdooConnection()
         await self.odoo_connection.connect()
+
+        snapshot = None
+        if settings.ODOO_SNAPSHOT_PATH:
+            snapshot = SnapshotStore(
+                path=settings.ODOO_SNAPSHOT_PATH,
+                max_age=settings.ODOO_SNAPSHOT_MAX_AGE
+            )
+            await snapshot.load()
+
         self.data_retriever = DataRetriever(
             odoo_connection=self.odoo_connection,
-            cutoff_date=self.cutoff
+            cutoff_date=self.cutoff,
+            snapshot=snapshot
         )
+        if snapshot is not None:
+            await self.data_retriever.sync_snapshot()
+        await self._load_rate_table()
+
+        await self._refresh_partner_index()
+
+    async def _load_rate_table(self) -> None:
+        """Carga la tabla de tipos de cambio indicada en ``FX_RATES_SOURCE``.
+
+        Las monedas que no aparezcan en la fuente usan las tasas fijas.
+        """
+        source = settings.FX_RATES_SOURCE
+        if source == "csv" and settings.FX_RATES_PATH:
+            table = RateTable.from_csv(settings.FX_RATES_PATH)
+        elif source == "odoo":
+            rates, companies = await asyncio.gather(
+                self.data_retriever.get_currency_rates(),
+                self.data_retriever.get_companies()
+            )
+            table = RateTable.from_odoo(rates, companies)
+        else:
+            return
+        self._cleaner.rate_table = table.with_fallback(RateTable.from_static(RATES))
+        print(f"Tipos de cambio cargados ({source}): {', '.join(self._cleaner.rate_table.currencies)}")
+
+    def get_connection_stats(self) -> dict:
+        """Devuelve las métricas del pool de conexiones con Odoo y de agrupación de descargas."""
+        stats = self.odoo_connection.get_pool_stats()
+        stats["single_flight"] = self.data_retriever.get_single_flight_stats()
+        return stats
+
+    def get_cache_stats(self) -> dict:
+        """Devuelve las métricas de la caché de facturas por cliente."""
+        return self._client_cache.get_stats()
+
+    def invalidate_client_cache(self, partner_id: int = None) -> int:
+        """Invalida la caché de facturas de un cliente (o de todos si no se indica).
+
+        Returns:
+            Número de entradas eliminadas.
+        """
+        if partner_id is None:
+            return self._client_cache.clear()
+        return self._client_cache.invalidate_where(lambda key: key[0] == int(partner_id))
+
+    async def refresh_snapshot(self) -> dict:
+        """Fuerza la sincronización del snapshot local con Odoo.
+
+        Invalida la caché de los clientes con facturas modificadas; si se ha
+        eliminado alguna factura, invalida toda la caché.
+        """
+        changes = await self.data_retriever.sync_snapshot()
+        updated, deleted = changes.get('account.move', ([], []))
+        if deleted:
+            self.invalidate_client_cache()
+        else:
+            for partner_id in {r['partner_id'][0] for r in updated if r.get('partner_id')}:
+                self.invalidate_client_cache(partner_id)
+        return changes
 
     # =========================================================================
     # MÉTODOS INTERNOS DE PROCESAMIENTO
     # =========================================================================
 
+    async def _get_book_df(self) -> pd.DataFrame:
+        """Obtiene TODAS las facturas de salida limpias hasta el cutoff.
+
+        La primera llamada descarga y limpia el libro completo. Después, cada
+        ``BOOK_REFRESH_INTERVAL`` segundos solo se descargan las facturas
+        posteriores a la última marca ``(write_date, id)`` y los IDs vigentes, y se
+        aplican con ``DataCleaner.clean_incremental``. El mismo delta actualiza
+        la tabla de estadísticas por partner. El DataFrame devuelto no debe
+        modificarse.
+        """
+        async with self._book_lock:
+            if (self._book_df is not None
+                    and time.monotonic() - self._book_refreshed_at < BOOK_REFRESH_INTERVAL):
+                return self._book_df
+
+            known_ids = None if self._book_df is None else self._book_df['id'].tolist()
+            delta, deleted_ids, self._book_watermark = await self._fetch_invoice_delta(
+                self._book_watermark, known_ids
+            )
+
+            if self._book_df is None:
+                book = pd.DataFrame()
+                if not delta.empty:
+                    book, _ = self._cleaner.clean_raw_data(delta)
+                    book = book.sort_values('id', kind='stable').reset_index(drop=True)
+                self._partner_stats = PartnerStatsTable.from_invoices(book, self.cutoff_ts)
+            elif delta.empty and not deleted_ids:
+                book = self._book_df
+            else:
+                book, _ = self._cleaner.clean_incremental(self._book_df, delta, deleted_ids)
+                self._invalidate_changed_clients(delta, deleted_ids)
+                self._update_partner_stats(book, delta, deleted_ids)
+
+            self._book_df = book
+            self._book_refreshed_at = time.monotonic()
+            return book
+
+    async def _fetch_invoice_delta(self, watermark: Optional[Tuple[str, int]],
+                                   known_ids: Optional[list]) -> Tuple[pd.DataFrame, list, Optional[Tuple[str, int]]]:
+        """Descarga las facturas de salida modificadas desde ``watermark`` y detecta las eliminadas.
+
+        Args:
+            watermark: Marca ``(write_date, id)`` de la última sincronización.
+            known_ids: IDs de las facturas ya cargadas. Si es None se trata de
+                la primera carga: se descargan todas y no hay eliminadas.
+
+        Returns:
+            Tupla (facturas raw nuevas o modificadas sin ``write_date``, IDs
+            eliminados, nueva marca de sincronización).
+        """
+        if known_ids is None:
+            raw_data = await self.data_retriever.get_outbound_invoices_changed_since(None)
+            deleted_ids = []
+        else:
+            raw_data, alive_ids = await asyncio.gather(
+                self.data_retriever.get_outbound_invoices_changed_since(watermark),
+                self.data_retriever.get_outbound_invoice_ids()
+            )
+            deleted_ids = list(set(known_ids) - set(alive_ids))
+
+        # Nueva marca: el (write_date, id) mayor; Odoo devuelve False si no hay write_date
+        stamped = [(r['write_date'], r['id']) for r in raw_data if r.get('write_date')]
+        if stamped:
+            watermark = max(stamped) if watermark is None else max(watermark, max(stamped))
+        delta = pd.DataFrame(raw_data)
+        if 'write_date' in delta.columns:
+            delta = delta.drop(columns='write_date')
+        return delta, deleted_ids, watermark
+
+    async def _get_partner_stats(self) -> PartnerStatsTable:
+        """Obtiene la tabla materializada de estadísticas por partner.
+
+        Se construye con la primera carga del libro y cada refresco del libro
+        le aplica el mismo delta (ver ``_update_partner_stats``), así que no
+        hace descargas propias.
+        """
+        await self._get_book_df()
+        return self._partner_stats
+
+    def _update_partner_stats(self, book: pd.DataFrame, delta: pd.DataFrame, deleted_ids: list) -> None:
+        """Aplica a la tabla de estadísticas un delta ya aplicado al libro.
+
+        Se retira la aportación anterior de las facturas modificadas o
+        eliminadas y se suma la de su versión limpia actual; ej. una factura
+        que pasa a pagada ajusta las sumas de su partner. Las modificadas que
+        ya no pasan la limpieza solo se retiran.
+        """
+        changed_ids = delta['id'].tolist() if not delta.empty else []
+        changed = book[book['id'].isin(changed_ids)] if changed_ids and not book.empty else None
+        self._partner_stats.apply(changed, deleted_ids + changed_ids)
+
+    async def _refresh_partner_index(self) -> None:
+        """Reconstruye el índice de nombres de clientes con todos los partners de Odoo.
+
+        Si falla la descarga se conserva el índice anterior (o ninguno) y
+        ``search_clients`` sigue consultando a Odoo.
+        """
+        try:
+            raw_data = await self.data_retriever.get_all_customer_partners()
+        except Exception as e:
+            print(f"Error al cargar el índice de clientes: {e!r}")
+            return
+        partners = [(record['id'], record.get('name')) for record in raw_data]
+        self._partner_index = await asyncio.to_thread(PartnerSearchIndex, partners)
+        self._partner_index_refreshed_at = time.monotonic()
+
+    def _schedule_partner_index_refresh(self) -> None:
+        """Lanza en segundo plano la recarga del índice si no existe o ha caducado."""
+        if (self._partner_index is not None
+                and time.monotonic() - self._partner_index_refreshed_at < PARTNER_INDEX_REFRESH_INTERVAL):
+            return
+        if self._partner_index_task is None or self._partner_index_task.done():
+            self._partner_index_task = asyncio.create_task(self._refresh_partner_index())
+
+    def _invalidate_changed_clients(self, delta: pd.DataFrame, deleted_ids: list) -> None:
+        """Invalida en la caché los clientes afectados por un delta del libro."""
+        stale_ids = set(deleted_ids)
+        partner_ids = set()
+        if not delta.empty:
+            stale_ids |= set(delta['id'].tolist())
+            partner_ids |= {p[0] for p in delta['partner_id'] if isinstance(p, (list, tuple))}
+        # Partner anterior de las facturas modificadas o eliminadas
+        previous = self._book_df.loc[self._book_df['id'].isin(stale_ids), 'partner_id']
+        partner_ids |= set(previous.dropna().astype(int).tolist())
+        for partner_id in partner_ids:
+            self.invalidate_client_cache(partner_id)
+
     async def _get_client_invoices_df(self, partner_id: int) -> pd.DataFrame:
-        """Obtiene TODAS las facturas de un cliente con campos de retraso calculados."""
+        """Obtiene TODAS las facturas de un cliente con campos de retraso calculados.
+
+        El resultado se guarda en caché por (partner_id, cutoff) y no debe modificarse.
+        """
+        cache_key = (int(partner_id), self.cutoff)
+        cached = self._client_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         raw_data = await self.data_retriever.get_invoices_by_partner(partner_id)
         if not raw_data:
             return pd.DataFrame()
@@ -62,6 +313,7 @@ class DataManager:
 
         # Calcular campos de retraso para facturas pagadas
         dataset = self._add_payment_delay_columns(clean_data)
+        self._client_cache.put(cache_key, dataset)
         return dataset
 
     def _add_payment_delay_columns(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -105,23 +357,66 @@ class DataManager:
         clean_df, _ = self._cleaner.clean_raw_data(df)
         return clean_df if clean_df is not None else pd.DataFrame()
 
-    def _calculate_risk_score(self, client: ClientInfo) -> float:
-        """Calcula puntuación de riesgo 0-100."""
-        score = 0.0
+    async def _fetch_clean_top(self, fetch_page, limit: Optional[int], keep) -> pd.DataFrame:
+        """Obtiene las primeras ``limit`` facturas limpias de una consulta ordenada en Odoo.
+
+        Pide ``limit * TOP_N_OVERFETCH_FACTOR`` registros ya ordenados y solo
+        hace otra petición si la limpieza descarta filas y faltan resultados.
+        Sin ``limit`` recupera todos los registros.
+
+        Args:
+            fetch_page: Corrutina ``(limit, offset) -> registros raw`` ordenados.
+            limit: Número de facturas necesarias (None o 0 para todas).
+            keep: Función que filtra el DataFrame limpio.
+
+        Returns:
+            DataFrame limpio con, como mucho, ``limit`` filas en el orden de Odoo.
+        """
+        page_size = limit * TOP_N_OVERFETCH_FACTOR if limit else None
+        frames = []
+        kept = 0
+        offset = 0
+        while not limit or kept < limit:
+            raw_invoices = await fetch_page(limit=page_size, offset=offset)
+            if raw_invoices:
+                df = await self._clean_raw_invoices(raw_invoices)
+                if not df.empty:
+                    df = keep(df)
+                    frames.append(df)
+                    kept += len(df)
+            if not limit or len(raw_invoices or []) < page_size:
+                break
+            offset += page_size
+
+        if not frames:
+            return pd.DataFrame()
+        # concat pierde las categorías si difieren entre páginas: reaplicar el esquema
+        df = self._cleaner.apply_schema(pd.concat(frames, ignore_index=True))
+        return df.head(limit) if limit else df
 
-        # Factor 1: Ratio de puntualidad (40%)
-        score += (1 - client.on_time_ratio) * 40
+    def _use_server_aggregation(self) -> bool:
+        """Indica si los informes globales se agregan en Odoo con read_group.
 
-        # Factor 2: Promedio de días de retraso (30%)
-        delay_score = min(client.avg_delay_days / 60, 1.0) * 30
-        score += delay_score
+        Con snapshot local las lecturas ya no cuestan tráfico, así que se agrega en local.
+        Con tipos de cambio por fecha tampoco: read_group agrupa por moneda y
+        solo podría convertir con una tasa por moneda, no con la de cada factura.
+        """
+        return (SERVER_SIDE_AGGREGATION and self.data_retriever.snapshot is None
+                and self._cleaner.rate_table.is_static)
 
-        # Factor 3: Facturas vencidas actuales (30%)
-        if client.total_invoices > 0:
-            overdue_ratio = client.overdue_invoices / client.total_invoices
-            score += overdue_ratio * 30
+    def _grouped_totals_eur(self, rows: list) -> tuple:
+        """Convierte a EUR las filas de read_group agrupadas por moneda.
 
-        return round(min(score, 100), 2)
+        Returns:
+            Tupla con (importe residual total en EUR, número de facturas).
+        """
+        total = 0.0
+        count = 0
+        for row in rows:
+            currency = row['currency_id'][1] if row.get('currency_id') else None
+            total += self._cleaner.convert_amount_to_eur(row['amount_residual'], currency)
+            count += row['__count']
+        return total, count
 
     def _is_overdue(self, due_date, cutoff: pd.Timestamp = None) -> bool:
         """Determina si una fecha de vencimiento está vencida."""
@@ -131,26 +426,35 @@ class DataManager:
             return False
         return due_date < cutoff
 
-    def _calculate_days_overdue(self, due_date, cutoff: pd.Timestamp = None) -> Optional[int]:
-        """Calcula días de vencimiento."""
-        if cutoff is None:
-            cutoff = self.cutoff_ts
-        if pd.isna(due_date):
-            return None
-        if due_date >= cutoff:
-            return None
-        return (cutoff - due_date).days
-
     # =========================================================================
     # MÉTODOS DE BÚSQUEDA
     # =========================================================================
 
     async def search_clients(self, name: str, limit: int = 5) -> List[ClientSearchResult]:
-        """Busca clientes por nombre."""
+        """Busca clientes por nombre.
+
+        Consulta primero el índice local (sin acentos y tolerante a erratas),
+        que se recarga en segundo plano cada ``PARTNER_INDEX_REFRESH_INTERVAL``
+        segundos. Si el índice no está cargado o ningún nombre contiene la
+        consulta (ej. un cliente creado después de la última recarga), se busca
+        también en Odoo: sus resultados van primero y después los aproximados
+        del índice.
+        """
+        self._schedule_partner_index_refresh()
+        matches = []
+        if self._partner_index is not None:
+            matches = self._partner_index.search(name, limit)
+            # Las coincidencias por subcadena tienen similitud > 1
+            if any(score > 1 for _, _, score in matches):
+                return [ClientSearchResult(id=partner_id, name=partner_name)
+                        for partner_id, partner_name, _ in matches]
+
         raw_data = await self.data_retriever.search_client_by_name(name, limit)
-        if not raw_data:
-            return []
-        return [ClientSearchResult(id=record['id'], name=record['name']) for record in raw_data]
+        results = {record['id']: record['name'] for record in raw_data or []}
+        for partner_id, partner_name, _ in matches:
+            results.setdefault(partner_id, partner_name)
+        return [ClientSearchResult(id=partner_id, name=partner_name)
+                for partner_id, partner_name in list(results.items())[:limit]]
 
     async def get_invoice_by_name(self, invoice_name: str) -> Optional[InvoiceSummary]:
         """Recupera una factura por su nombre."""
@@ -172,64 +476,46 @@ class DataManager:
         if invoice_df.empty:
             return None
 
-        row = invoice_df.iloc[0]
-        days_overdue = self._calculate_days_overdue(row['invoice_date_due'])
-
-        return InvoiceSummary(
-            id=int(row['id']),
-            name=row['name'],
-            amount_eur=round(float(row['amount_residual_eur']), 2),  # RESIDUAL para deuda
-            invoice_date=row['invoice_date'].date() if pd.notna(row['invoice_date']) else None,
-            due_date=row['invoice_date_due'].date() if pd.notna(row['invoice_date_due']) else None,
-            payment_state=PaymentState(row['payment_state']),
-            payment_date=row['payment_dates'].date() if pd.notna(row.get('payment_dates')) else None,
-            paid_late=bool(row['paid_late']) if pd.notna(row.get('paid_late')) else None,
-            delay_days=int(row['payment_overdue_days']) if pd.notna(row.get('payment_overdue_days')) else None,
-            days_overdue=days_overdue,
+        return build_invoice_summaries(
+            invoice_df.head(1),
+            amount_eur=invoice_df['amount_residual_eur'].head(1),  # RESIDUAL para deuda
+            days_overdue=days_overdue_at(invoice_df['invoice_date_due'].head(1), self.cutoff_ts),
             partner_id=partner_id,
-        )
+            with_payment_info=True,
+        )[0]
 
     # =========================================================================
     # MÉTODOS DE INFORMACIÓN DE CLIENTE
     # =========================================================================
 
     async def get_client_info(self, partner_id: int) -> Optional[ClientInfo]:
-        """Obtiene información y estadísticas de un cliente."""
-        df = await self._get_client_invoices_df(partner_id)
-
-        if df.empty:
+        """Obtiene información y estadísticas de un cliente de la tabla materializada."""
+        table = await self._get_partner_stats()
+        stats = table.client_stats([partner_id])
+        if stats.empty:
             return None
+        return self._client_infos_from_stats(stats)[0]
 
-        paid_df = df[df['payment_state'] == 'paid']
-        unpaid_df = df[df['payment_state'] == 'not_paid']
-
-        overdue_df = unpaid_df[unpaid_df['invoice_date_due'] < self.cutoff_ts]
-
-        paid_count = len(paid_df)
-        on_time_ratio = 0.0
-        avg_delay_days = 0.0
-
-        if paid_count > 0:
-            on_time_count = (paid_df['paid_late'] == False).sum()
-            on_time_ratio = round(on_time_count / paid_count, 4)
-            avg_delay_days = round(float(paid_df['payment_overdue_days'].mean()), 2)
-
-        client_info = ClientInfo(
-            id=partner_id,
-            name=df['partner_name'].iloc[0],
-            country_name=df.get('country_name', pd.Series([None])).iloc[0],
-            total_invoices=len(df),
-            paid_invoices=paid_count,
-            unpaid_invoices=len(unpaid_df),
-            overdue_invoices=len(overdue_df),
-            total_invoiced_eur=round(float(df['amount_total_eur'].sum()), 2),
-            total_outstanding_eur=round(float(unpaid_df['amount_residual_eur'].sum()), 2),
-            on_time_ratio=on_time_ratio,
-            avg_delay_days=avg_delay_days,
-        )
+    def _compute_client_stats(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Calcula los campos de ``ClientInfo`` y el risk score de todos los clientes de ``df``.
 
-        client_info.risk_score = self._calculate_risk_score(client_info)
-        return client_info
+        Usa las mismas fórmulas que la tabla materializada (``PartnerStatsTable``)
+        sobre una tabla construida solo con estas facturas.
+
+        Args:
+            df: Facturas limpias de uno o varios clientes.
+
+        Returns:
+            DataFrame indexado por partner_id con una columna por campo de ``ClientInfo``.
+        """
+        return PartnerStatsTable.from_invoices(df, self.cutoff_ts).client_stats()
+
+    def _client_infos_from_stats(self, stats: pd.DataFrame) -> List[ClientInfo]:
+        """Convierte el resultado de ``_compute_client_stats`` en ``ClientInfo`` (en su orden)."""
+        return [
+            ClientInfo(id=partner_id, country_name=None, **row)
+            for partner_id, row in zip(stats.index.tolist(), stats.to_dict('records'))
+        ]
 
     async def get_client_invoices(self, partner_id: int, limit: int = 20,
                                   only_unpaid: bool = False,
@@ -247,34 +533,19 @@ class DataManager:
 
         df = df.head(limit)
 
-        invoices = []
-        for _, row in df.iterrows():
-            days_overdue = None
-            if row['payment_state'] == 'not_paid':
-                days_overdue = self._calculate_days_overdue(row['invoice_date_due'])
+        # Días vencidos solo para las no pagadas
+        days_overdue = days_overdue_at(df['invoice_date_due'], self.cutoff_ts)
+        days_overdue = days_overdue.where(df['payment_state'] == 'not_paid')
 
-            # Para facturas pagadas, mostrar amount_total
-            # Para facturas pendientes, mostrar amount_residual
-            if row['payment_state'] == 'paid':
-                amount = float(row['amount_total_eur'])
-            else:
-                amount = float(row['amount_residual_eur'])
-
-            invoices.append(InvoiceSummary(
-                id=int(row['id']),
-                name=row['name'],
-                amount_eur=round(amount, 2),
-                invoice_date=row['invoice_date'].date() if pd.notna(row['invoice_date']) else None,
-                due_date=row['invoice_date_due'].date() if pd.notna(row['invoice_date_due']) else None,
-                payment_state=PaymentState(row['payment_state']),
-                payment_date=row['payment_dates'].date() if pd.notna(row.get('payment_dates')) else None,
-                paid_late=bool(row['paid_late']) if pd.notna(row.get('paid_late')) else None,
-                delay_days=int(row['payment_overdue_days']) if pd.notna(row.get('payment_overdue_days')) else None,
-                days_overdue=days_overdue,
-                partner_id=partner_id,
-            ))
-
-        return invoices
+        # Para facturas pagadas, mostrar amount_total
+        # Para facturas pendientes, mostrar amount_residual
+        return build_invoice_summaries(
+            df,
+            amount_eur=amount_by_state(df),
+            days_overdue=days_overdue,
+            partner_id=partner_id,
+            with_payment_info=True,
+        )
 
     async def get_all_partners(self) -> pd.DataFrame:
         """Obtiene todos los clientes."""
@@ -346,6 +617,23 @@ class DataManager:
             probabilities=prob_dict
         )
 
+    async def predict_many(self, invoice_ids: List[int]) -> FanOutResult:
+        """Predice el riesgo de impago de varias facturas en paralelo.
+
+        Como mucho ``FAN_OUT_CONCURRENCY`` predicciones a la vez, cada una con
+        un timeout de ``FAN_OUT_TIMEOUT`` segundos. Una factura que falla no
+        detiene el resto.
+
+        Returns:
+            FanOutResult con un PredictionResult por factura (en el orden de
+            ``invoice_ids``) y los errores de las que han fallado.
+        """
+        result = await fan_out(invoice_ids, self.predict, limit=FAN_OUT_CONCURRENCY,
+                               timeout=FAN_OUT_TIMEOUT)
+        for invoice_id, error in result.failed:
+            print(f"Error al predecir la factura {invoice_id}: {error!r}")
+        return result
+
     async def predict_hypothetical(
             self, partner_id: int, amount_eur: float, invoice_date: str = None,
             due_date: str = None, payment_term_days: int = 30) -> PredictionResult:
@@ -400,86 +688,72 @@ class DataManager:
     # =========================================================================
 
     async def get_overdue_invoices(self, limit: int = None, min_days_overdue: int = 1) -> List[InvoiceSummary]:
-        """Obtiene facturas vencidas de todos los clientes."""
-        raw_invoices = await self.data_retriever.get_all_overdue_invoices(
-            min_days_overdue=min_days_overdue,
-            limit=None  # Recuperar todas, filtrar después
-        )
+        """Obtiene facturas vencidas de todos los clientes.
 
-        if not raw_invoices:
-            return []
+        Con ``limit``, Odoo devuelve ya ordenadas las más antiguas y solo se
+        descargan las necesarias; sin él se recuperan todas.
+        """
+        def keep(df: pd.DataFrame) -> pd.DataFrame:
+            # Filtrar solo no pagadas y calcular días vencidos
+            df = df[df['payment_state'] == 'not_paid'].copy()
+            df['days_overdue'] = (self.cutoff_ts - df['invoice_date_due']).dt.days
+            return df[df['days_overdue'] >= min_days_overdue]
+
+        async def fetch_page(limit: Optional[int], offset: int) -> list:
+            return await self.data_retriever.get_all_overdue_invoices(
+                min_days_overdue=min_days_overdue, limit=limit, offset=offset,
+                order='invoice_date_due asc, id asc'
+            )
 
-        df = await self._clean_raw_invoices(raw_invoices)
+        df = await self._fetch_clean_top(fetch_page, limit, keep)
 
         if df.empty:
             return []
 
-        # Filtrar solo no pagadas
-        df = df[df['payment_state'] == 'not_paid']
-
-        # Calcular días vencidos
-        df['days_overdue'] = (self.cutoff_ts - df['invoice_date_due']).dt.days
-        df = df[df['days_overdue'] >= min_days_overdue]
-
         # Ordenar por días vencidos
-        df = df.sort_values('days_overdue', ascending=False)
-
-        if limit is not None and limit > 0:
-            df = df.head(limit)
-
-        results = []
-        for _, row in df.iterrows():
-            results.append(InvoiceSummary(
-                id=int(row['id']),
-                name=row['name'],
-                amount_eur=round(float(row['amount_residual_eur']), 2),
-                invoice_date=row['invoice_date'].date() if pd.notna(row['invoice_date']) else None,
-                due_date=row['invoice_date_due'].date() if pd.notna(row['invoice_date_due']) else None,
-                payment_state=PaymentState.NOT_PAID,
-                days_overdue=int(row['days_overdue']),
-                partner_id=int(row['partner_id']),
-                partner_name=row.get('partner_name')
-            ))
-
-        return results
+        df = df.sort_values('days_overdue', ascending=False, kind='stable')
+
+        return build_invoice_summaries(
+            df,
+            amount_eur=df['amount_residual_eur'],
+            days_overdue=df['days_overdue'],
+            payment_state=PaymentState.NOT_PAID,
+            with_partner_name=True,
+        )
 
     async def get_upcoming_due_invoices(self, days_ahead: int = 7, limit: int = 20) -> List[InvoiceSummary]:
         """Obtiene facturas que vencen en los próximos X días."""
         end_date = (self.cutoff_ts + pd.Timedelta(days=days_ahead)).strftime('%Y-%m-%d')
 
-        raw_invoices = await self.data_retriever.get_invoices_due_between(
-            start_date=self.cutoff,
-            end_date=end_date,
-            only_unpaid=True
-        )
+        async def fetch_page(limit: Optional[int], offset: int) -> list:
+            return await self.data_retriever.get_invoices_due_between(
+                start_date=self.cutoff,
+                end_date=end_date,
+                only_unpaid=True,
+                limit=limit,
+                offset=offset,
+                order='invoice_date_due asc, id asc'
+            )
 
-        if not raw_invoices:
-            return []
+        def keep(df: pd.DataFrame) -> pd.DataFrame:
+            df = df[df['payment_state'] == 'not_paid'].copy()
+            df['days_until_due'] = (df['invoice_date_due'] - self.cutoff_ts).dt.days
+            return df
 
-        df = await self._clean_raw_invoices(raw_invoices)
+        df = await self._fetch_clean_top(fetch_page, limit, keep)
 
         if df.empty:
             return []
 
-        df = df[df['payment_state'] == 'not_paid']
-        df['days_until_due'] = (df['invoice_date_due'] - self.cutoff_ts).dt.days
-        df = df.sort_values('days_until_due').head(limit)
-
-        results = []
-        for _, row in df.iterrows():
-            results.append(InvoiceSummary(
-                id=int(row['id']),
-                name=row['name'],
-                amount_eur=round(float(row['amount_residual_eur']), 2),
-                invoice_date=row['invoice_date'].date() if pd.notna(row['invoice_date']) else None,
-                due_date=row['invoice_date_due'].date() if pd.notna(row['invoice_date_due']) else None,
-                payment_state=PaymentState.NOT_PAID,
-                days_overdue=-int(row['days_until_due']),
-                partner_id=int(row['partner_id']),
-                partner_name=row.get('partner_name')
-            ))
+        df = df.sort_values('days_until_due', kind='stable')
 
-        return results
+        return build_invoice_summaries(
+            df,
+            amount_eur=df['amount_residual_eur'],
+            days_overdue=-df['days_until_due'],
+            payment_state=PaymentState.NOT_PAID,
+            with_partner_name=True,
+        )
 
     async def get_invoices_by_period(self, start_date: str, end_date: str,
                                      partner_id: int = None, only_unpaid: bool = False) -> List[InvoiceSummary]:
@@ -504,29 +778,13 @@ class DataManager:
 
         df = df.sort_values('invoice_date', ascending=False)
 
-        results = []
-        for _, row in df.iterrows():
-            days_overdue = self._calculate_days_overdue(row['invoice_date_due'])
-
-            # Usar amount apropiado según estado
-            if row['payment_state'] == 'paid':
-                amount = float(row['amount_total_eur'])
-            else:
-                amount = float(row['amount_residual_eur'])
-
-            results.append(InvoiceSummary(
-                id=int(row['id']),
-                name=row['name'],
-                amount_eur=round(amount, 2),
-                invoice_date=row['invoice_date'].date() if pd.notna(row['invoice_date']) else None,
-                due_date=row['invoice_date_due'].date() if pd.notna(row['invoice_date_due']) else None,
-                payment_state=PaymentState(row['payment_state']),
-                days_overdue=days_overdue,
-                partner_id=int(row['partner_id']),
-                partner_name=row.get('partner_name')
-            ))
-
-        return results
+        # Usar amount apropiado según estado
+        return build_invoice_summaries(
+            df,
+            amount_eur=amount_by_state(df),
+            days_overdue=days_overdue_at(df['invoice_date_due'], self.cutoff_ts),
+            with_partner_name=True,
+        )
 
     # =========================================================================
     # MÉTODOS DE ANÁLISIS DE CARTERA
@@ -534,58 +792,64 @@ class DataManager:
 
     async def get_high_risk_clients(self, limit: int = None) -> List[ClientInfo]:
         """Obtiene los clientes con mayor riesgo."""
-        partner_ids = await self.data_retriever.get_partners_with_overdue_invoices()
+        partner_ids, table = await asyncio.gather(
+            self.data_retriever.get_partners_with_overdue_invoices(),
+            self._get_partner_stats()
+        )
         if not partner_ids:
             return []
 
-        results = []
-        for partner_id in partner_ids:
-            client_info = await self.get_client_info(partner_id)
-            if client_info is None:
-                continue
-            results.append(client_info)
-
-        results.sort(key=lambda x: x.risk_score, reverse=True)
+        # Orden de partner_ids para desempatar igual que una ordenación estable
+        stats = table.client_stats(partner_ids)
 
         if limit is None:
-            return results
-        return results[:limit]
+            ranked = stats.sort_values('risk_score', ascending=False, kind='stable')
+        else:
+            ranked = stats.nlargest(limit, 'risk_score', keep='first')
+        return self._client_infos_from_stats(ranked)
 
     async def compare_clients(self, partner_ids: List[int]) -> List[ClientInfo]:
-        """Compara clientes."""
+        """Compara clientes con las estadísticas de la tabla materializada."""
         if len(partner_ids) < 2:
             return []
 
-        results = []
-        for partner_id in partner_ids:
-            client_info = await self.get_client_info(partner_id)
-            if client_info is None:
-                continue
-            results.append(client_info)
-
-        results.sort(key=lambda x: x.risk_score)
-        return results
+        # Cada cliente se consulta una vez; el resultado conserva las repeticiones
+        table = await self._get_partner_stats()
+        stats = table.client_stats(dict.fromkeys(int(pid) for pid in partner_ids))
+        if stats.empty:
+            return []
+        stats = stats.loc[[int(pid) for pid in partner_ids if int(pid) in stats.index]]
+        stats = stats.sort_values('risk_score', kind='stable')
+        return self._client_infos_from_stats(stats)
 
-    async def get_aging_report(self, partner_id: int = None) -> AgingReport:
+    async def get_aging_report(self, partner_id: int = None, bucket_edges: List[int] = None,
+                               group_by: str = None) -> AgingReport:
         """Genera informe de antigüedad de deuda (aging report).
+
+        Args:
+            partner_id: Cliente (opcional). Si no se indica, aging de toda la cartera.
+            bucket_edges: Límites de los buckets en días vencidos (por defecto
+                ``AGING_BUCKET_EDGES``).
+            group_by: Desglose opcional por ``'company'`` o ``'currency'``.
         """
+        edges = normalize_edges(bucket_edges or AGING_BUCKET_EDGES)
+        group_by = AgingGroupBy(group_by) if group_by else None
+
         if partner_id:
             # Aging para un cliente específico
             df = await self._get_client_invoices_df(partner_id)
 
             if df.empty:
-                return AgingReport(
-                    total_overdue_eur=0,
-                    total_overdue_count=0,
-                    buckets=[],
-                    generated_at=self.cutoff_ts.date()
-                )
+                return self._empty_aging_report(group_by)
 
             # Filtrar solo facturas vencidas no pagadas
             df = df[
                 (df['payment_state'] == 'not_paid') &
                 (df['invoice_date_due'] < self.cutoff_ts)
                 ]
+        elif self._use_server_aggregation() and group_by != AgingGroupBy.COMPANY:
+            # Aging global agregado en Odoo: solo viajan filas por bucket y moneda
+            return await self._get_global_aging_report_grouped(edges, group_by)
         else:
             # Aging global
             raw_invoices = await self.data_retriever.get_all_overdue_invoices(
@@ -594,32 +858,17 @@ class DataManager:
             )
 
             if not raw_invoices:
-                return AgingReport(
-                    total_overdue_eur=0,
-                    total_overdue_count=0,
-                    buckets=[],
-                    generated_at=self.cutoff_ts.date()
-                )
+                return self._empty_aging_report(group_by)
 
             df = await self._clean_raw_invoices(raw_invoices)
 
             if df.empty:
-                return AgingReport(
-                    total_overdue_eur=0,
-                    total_overdue_count=0,
-                    buckets=[],
-                    generated_at=self.cutoff_ts.date()
-                )
+                return self._empty_aging_report(group_by)
 
             df = df[df['payment_state'] == 'not_paid']
 
         if df.empty:
-            return AgingReport(
-                total_overdue_eur=0,
-                total_overdue_count=0,
-                buckets=[],
-                generated_at=self.cutoff_ts.date()
-            )
+            return self._empty_aging_report(group_by)
 
         # Calcular días vencidos
         df = df.copy()
@@ -627,42 +876,70 @@ class DataManager:
         df = df[df['days_overdue'] > 0]
 
         if df.empty:
-            return AgingReport(
-                total_overdue_eur=0,
-                total_overdue_count=0,
-                buckets=[],
-                generated_at=self.cutoff_ts.date()
-            )
+            return self._empty_aging_report(group_by)
+
+        # IMPORTANTE: Usar amount_residual_eur para deuda real pendiente
+        buckets_data = aggregate_aging(df, edges)[None]
+        groups_data = None
+        if group_by is not None:
+            groups_data = aggregate_aging(df, edges, AGING_GROUP_COLUMNS[group_by.value])
+
+        return self._build_aging_report(buckets_data, group_by, groups_data)
+
+    async def _get_global_aging_report_grouped(self, edges: List[int],
+                                               group_by: AgingGroupBy = None) -> AgingReport:
+        """Genera el aging global con un read_group por bucket agrupado por moneda."""
+        ranges = []
+        for label, min_days, max_days in aging_buckets(edges):
+            start = None
+            if max_days is not None:
+                start = (self.cutoff_ts - pd.Timedelta(days=max_days)).strftime('%Y-%m-%d')
+            end = (self.cutoff_ts - pd.Timedelta(days=min_days)).strftime('%Y-%m-%d')
+            ranges.append((label, start, end))
+
+        grouped = await self.data_retriever.get_unpaid_amounts_by_due_range(
+            ranges, base_domain=self._cleaner.unpaid_invoices_domain()
+        )
 
-        # Inicializar buckets
-        buckets_data = {
-            '0-30': {'count': 0, 'amount': 0.0},
-            '31-60': {'count': 0, 'amount': 0.0},
-            '61-90': {'count': 0, 'amount': 0.0},
-            '>90': {'count': 0, 'amount': 0.0},
-        }
+        buckets_data = {}
+        groups_data = {} if group_by == AgingGroupBy.CURRENCY else None
+        for label, _, _ in ranges:
+            amount, count = self._grouped_totals_eur(grouped[label])
+            buckets_data[label] = {'count': count, 'amount': amount}
+            if groups_data is not None:
+                # Las filas de read_group ya vienen agrupadas por moneda
+                for row in grouped[label]:
+                    currency = row['currency_id'][1] if row.get('currency_id') else UNASSIGNED_GROUP
+                    amount, count = self._grouped_totals_eur([row])
+                    data = groups_data.setdefault(
+                        currency, {name: {'count': 0, 'amount': 0.0} for name, _, _ in ranges}
+                    )[label]
+                    data['count'] += count
+                    data['amount'] += amount
+
+        if sum(data['count'] for data in buckets_data.values()) == 0:
+            return self._empty_aging_report(group_by)
+        return self._build_aging_report(buckets_data, group_by, groups_data)
+
+    def _empty_aging_report(self, group_by: AgingGroupBy = None) -> AgingReport:
+        """AgingReport sin facturas vencidas."""
+        return AgingReport(
+            total_overdue_eur=0,
+            total_overdue_count=0,
+            buckets=[],
+            generated_at=self.cutoff_ts.date(),
+            group_by=group_by,
+            groups=[] if group_by is not None else None
+        )
 
-        for _, row in df.iterrows():
-            days = row['days_overdue']
-            # IMPORTANTE: Usar amount_residual_eur para deuda real pendiente
-            amount = float(row['amount_residual_eur'])
-
-            if days <= 30:
-                buckets_data['0-30']['count'] += 1
-                buckets_data['0-30']['amount'] += amount
-            elif days <= 60:
-                buckets_data['31-60']['count'] += 1
-                buckets_data['31-60']['amount'] += amount
-            elif days <= 90:
-                buckets_data['61-90']['count'] += 1
-                buckets_data['61-90']['amount'] += amount
-            else:
-                buckets_data['>90']['count'] += 1
-                buckets_data['>90']['amount'] += amount
+    def _build_aging_buckets(self, buckets_data: Dict[str, Dict[str, Any]]) -> tuple:
+        """Construye los AgingBucket a partir de importes y recuentos por bucket.
 
-        total_amount = df['amount_residual_eur'].sum()
+        Returns:
+            Tupla con (importe total, lista de AgingBucket).
+        """
+        total_amount = sum(data['amount'] for data in buckets_data.values())
 
-        # Generar buckets
         buckets = []
         for label, data in buckets_data.items():
             pct = (data['amount'] / total_amount * 100) if total_amount > 0 else 0
@@ -672,57 +949,70 @@ class DataManager:
                 total_amount_eur=round(data['amount'], 2),
                 percentage=round(pct, 2)
             ))
+        return total_amount, buckets
+
+    def _build_aging_report(self, buckets_data: Dict[str, Dict[str, Any]],
+                            group_by: AgingGroupBy = None,
+                            groups_data: Dict[str, Dict[str, Dict[str, Any]]] = None) -> AgingReport:
+        """Construye el AgingReport a partir de importes y recuentos por bucket (y grupo)."""
+        total_amount, buckets = self._build_aging_buckets(buckets_data)
+
+        groups = None
+        if group_by is not None:
+            groups = []
+            for name, data in (groups_data or {}).items():
+                group_amount, group_buckets = self._build_aging_buckets(data)
+                groups.append(AgingGroup(
+                    name=str(name),
+                    total_overdue_eur=round(float(group_amount), 2),
+                    total_overdue_count=sum(b.invoice_count for b in group_buckets),
+                    buckets=group_buckets
+                ))
+            groups.sort(key=lambda group: group.total_overdue_eur, reverse=True)
 
         return AgingReport(
             total_overdue_eur=round(float(total_amount), 2),
             total_overdue_count=sum(b.invoice_count for b in buckets),
             buckets=buckets,
-            generated_at=self.cutoff_ts.date()
+            generated_at=self.cutoff_ts.date(),
+            group_by=group_by,
+            groups=groups
         )
 
     async def get_portfolio_summary(self) -> PortfolioSummary:
-        """Genera resumen de cartera."""
-        raw_unpaid = await self.data_retriever.get_all_unpaid_invoices(limit=None)
-        df_unpaid = await self._clean_raw_invoices(raw_unpaid)
-
-        total_outstanding = 0.0
-        total_overdue = 0.0
-        total_not_due = 0.0
-        overdue_count = 0
-        not_due_count = 0
-
-        if not df_unpaid.empty:
-            df_unpaid = df_unpaid[df_unpaid['payment_state'] == 'not_paid']
-
-            for _, row in df_unpaid.iterrows():
-                # IMPORTANTE: Usar amount_residual_eur
-                amount = float(row['amount_residual_eur'])
-                due_date = row['invoice_date_due']
-
-                total_outstanding += amount
-
-                if due_date < self.cutoff_ts:
-                    total_overdue += amount
-                    overdue_count += 1
-                else:
-                    total_not_due += amount
-                    not_due_count += 1
-
-        # Calcular DSO
-        all_invoices = await self.data_retriever.get_all_outbound_invoices()
-        df_all = await self._clean_raw_invoices(all_invoices)
-
-        total_delay_days = 0.0
-        paid_count = 0
-
-        if not df_all.empty:
-            paid_df = df_all[df_all['payment_state'] == 'paid']
-            if len(paid_df) > 0:
-                paid_df = self._add_payment_delay_columns(paid_df)
-                total_delay_days = paid_df['payment_overdue_days'].sum()
-                paid_count = len(paid_df)
-
-        avg_delay = (total_delay_days / paid_count) if paid_count > 0 else 0
+        """Genera resumen de cartera.
+
+        Todas las métricas salen del libro de facturas limpias (``_get_book_df``),
+        que ya incluye las pendientes: una sola descarga (incremental tras la
+        primera) y sumas con máscaras en lugar de recorrer filas.
+        """
+        df = await self._get_book_df()
+
+        total_overdue = total_not_due = 0.0
+        overdue_count = not_due_count = 0
+        avg_delay = 0.0
+
+        if not df.empty:
+            # IMPORTANTE: Usar amount_residual_eur
+            residual = df['amount_residual_eur'].to_numpy(dtype=float)
+            unpaid = (df['payment_state'] == 'not_paid').to_numpy()
+            is_overdue = unpaid & (df['invoice_date_due'] < self.cutoff_ts).to_numpy()
+            is_not_due = unpaid & ~is_overdue
+
+            total_overdue = float(residual[is_overdue].sum())
+            total_not_due = float(residual[is_not_due].sum())
+            overdue_count = int(is_overdue.sum())
+            not_due_count = int(is_not_due.sum())
+
+            # Calcular DSO: retraso medio de las pagadas (días entre pago y vencimiento)
+            paid = (df['payment_state'] == 'paid').to_numpy()
+            paid_count = int(paid.sum())
+            if paid_count > 0:
+                delay_days = (df['payment_dates'] - df['invoice_date_due']).dt.days
+                total_delay_days = float(np.nansum(delay_days.to_numpy(dtype=float, na_value=np.nan)[paid]))
+                avg_delay = total_delay_days / paid_count
+
+        total_outstanding = total_overdue + total_not_due
         dso = 30 + avg_delay
 
         return PortfolioSummary(
@@ -741,92 +1031,84 @@ class DataManager:
     # =========================================================================
 
     async def get_client_trend(self, partner_id: int, recent_months: int = 6) -> Optional[ClientTrend]:
-        """Analiza la tendencia de comportamiento de pago de un cliente."""
-        df = await self._get_client_invoices_df(partner_id)
+        """Analiza la tendencia de comportamiento de pago de un cliente.
 
-        if df.empty:
-            return None
-
-        paid_df = df[df['payment_state'] == 'paid'].copy()
-        if len(paid_df) < 4:
-            return None
-
-        recent_start = self.cutoff_ts - pd.DateOffset(months=recent_months)
-        recent = paid_df[paid_df['invoice_date'] >= recent_start]
-        previous = paid_df[paid_df['invoice_date'] < recent_start]
-
-        def calc_stats(subset):
-            if len(subset) == 0:
-                return 0, 0.0, 0.0
-            # puede ser object, no bool
-            on_time = (subset['paid_late'] == False).sum() / len(subset)
-            avg_delay = subset['payment_overdue_days'].mean()
-            return len(subset), round(on_time, 4), round(avg_delay, 2)
-
-        recent_count, recent_otr, recent_delay = calc_stats(recent)
-        prev_count, prev_otr, prev_delay = calc_stats(previous)
-        change_otr = recent_otr - prev_otr
-        change_delay = recent_delay - prev_delay
-
-        if prev_count == 0:
-            trend = "sin_historial"
-        elif change_otr > 0.05 or change_delay < -5:
-            trend = "mejorando"
-        elif change_otr < -0.05 or change_delay > 5:
-            trend = "empeorando"
+        Con el período reciente por defecto (``PARTNER_STATS_RECENT_MONTHS``)
+        la tendencia se consulta en la tabla materializada; con otro se
+        calcula a partir de las facturas del cliente.
+        """
+        if recent_months == PARTNER_STATS_RECENT_MONTHS:
+            table = await self._get_partner_stats()
+            trends = table.client_trends([partner_id])
         else:
-            trend = "estable"
-
+            df = await self._get_client_invoices_df(partner_id)
+            if df.empty:
+                return None
+            trends = self._compute_client_trends(df, recent_months)
+        if trends.empty:
+            return None
+        row = trends.iloc[0]
         return ClientTrend(
             partner_id=partner_id,
-            partner_name=df['partner_name'].iloc[0],
-            recent_invoices=recent_count,
-            recent_on_time_ratio=recent_otr,
-            recent_avg_delay=recent_delay,
-            previous_invoices=prev_count,
-            previous_on_time_ratio=prev_otr,
-            previous_avg_delay=prev_delay,
-            trend=trend,
-            change_on_time_ratio=round(change_otr, 4),
-            change_avg_delay=round(change_delay, 2)
+            partner_name=row['partner_name'],
+            recent_invoices=int(row['recent_invoices']),
+            recent_on_time_ratio=row['recent_on_time_ratio'],
+            recent_avg_delay=row['recent_avg_delay'],
+            previous_invoices=int(row['previous_invoices']),
+            previous_on_time_ratio=row['previous_on_time_ratio'],
+            previous_avg_delay=row['previous_avg_delay'],
+            trend=row['trend'],
+            change_on_time_ratio=row['change_on_time_ratio'],
+            change_avg_delay=row['change_avg_delay']
         )
 
+    def _compute_client_trends(self, df: pd.DataFrame, recent_months: int = 6) -> pd.DataFrame:
+        """Calcula la tendencia de pago de todos los clientes de ``df``.
+
+        Usa las mismas fórmulas que la tabla materializada (``PartnerStatsTable``)
+        sobre una tabla construida solo con estas facturas. Los clientes con
+        menos de 4 facturas pagadas no tienen tendencia.
+
+        Args:
+            df: Facturas limpias de uno o varios clientes.
+            recent_months: Meses que forman el período reciente.
+
+        Returns:
+            DataFrame indexado por partner_id (en orden de aparición en ``df``)
+            con los campos de ``ClientTrend``.
+        """
+        return PartnerStatsTable.from_invoices(df, self.cutoff_ts, recent_months).client_trends()
+
     async def get_deteriorating_clients(self, limit: int = 10, min_invoices: int = 5) -> List[DeterioratingClient]:
-        """Identifica clientes cuyo comportamiento de pago está empeorando."""
-        partner_ids = await self.data_retriever.get_partners_with_overdue_invoices()
+        """Identifica clientes cuyo comportamiento de pago está empeorando.
 
-        all_invoices = await self.data_retriever.get_all_outbound_invoices()
-        df = pd.DataFrame(all_invoices)
-        if not df.empty:
-            clean_df, _ = self._cleaner.clean_raw_data(df)
-            if clean_df is not None and not clean_df.empty:
-                all_partner_ids = clean_df['partner_id'].unique().tolist()
-                partner_ids = list(set(partner_ids + all_partner_ids))
-
-        results = []
-        for pid in partner_ids:
-            trend = await self.get_client_trend(pid, recent_months=6)
-            if trend is None:
-                continue
-            if trend.previous_invoices < min_invoices:
-                continue
-            if trend.trend != "empeorando":
-                continue
-            client_info = await self.get_client_info(pid)
-            if client_info is None:
-                continue
-            results.append(DeterioratingClient(
-                partner_id=pid,
-                partner_name=trend.partner_name,
-                previous_on_time_ratio=trend.previous_on_time_ratio,
-                recent_on_time_ratio=trend.recent_on_time_ratio,
-                change_on_time_ratio=trend.change_on_time_ratio,
-                previous_avg_delay=trend.previous_avg_delay,
-                recent_avg_delay=trend.recent_avg_delay,
-                change_avg_delay=trend.change_avg_delay,
-                current_overdue_count=client_info.overdue_invoices,
-                current_overdue_eur=client_info.total_outstanding_eur
-            ))
+        Tendencias y deuda actual se consultan en la tabla materializada de
+        estadísticas por partner, sin volver a recorrer facturas.
+        """
+        table = await self._get_partner_stats()
+        trends = table.client_trends()
+        trends = trends[(trends['previous_invoices'] >= min_invoices) & (trends['trend'] == "empeorando")]
+        if trends.empty:
+            return []
+        trends = trends.nsmallest(limit, 'change_on_time_ratio', keep='first')
 
-        results.sort(key=lambda x: x.change_on_time_ratio)
-        return results[:limit]
+        stats = table.client_stats(trends.index)
+
+        return [
+            DeterioratingClient(
+                partner_id=partner_id,
+                partner_name=trend['partner_name'],
+                previous_on_time_ratio=trend['previous_on_time_ratio'],
+                recent_on_time_ratio=trend['recent_on_time_ratio'],
+                change_on_time_ratio=trend['change_on_time_ratio'],
+                previous_avg_delay=trend['previous_avg_delay'],
+                recent_avg_delay=trend['recent_avg_delay'],
+                change_avg_delay=trend['change_avg_delay'],
+                current_overdue_count=int(overdue_count),
+                current_overdue_eur=outstanding
+            )
+            for partner_id, trend, overdue_count, outstanding in zip(
+                trends.index.tolist(), trends.to_dict('records'),
+                stats['overdue_invoices'].tolist(), stats['total_outstanding_eur'].tolist()
+            )
+        ]
@@ -0,0 +1,279 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import PARTNER_STATS_RECENT_MONTHS
+
+# Columnas sumables: cada factura aporta un valor y cada partner guarda la suma
+_COUNT_COLUMNS = [
+    'total_invoices', 'paid_invoices', 'unpaid_invoices', 'overdue_invoices', 'on_time_count',
+    'delay_count', 'recent_invoices', 'recent_on_time', 'recent_delay_count',
+    'previous_invoices', 'previous_on_time', 'previous_delay_count',
+]
+_AMOUNT_COLUMNS = [
+    'total_invoiced_eur', 'total_outstanding_eur', 'delay_sum', 'recent_delay_sum', 'previous_delay_sum',
+]
+_SUM_COLUMNS = _COUNT_COLUMNS + _AMOUNT_COLUMNS
+
+
+class PartnerStatsTable:
+    """Tabla materializada de estadísticas de pago por partner.
+
+    Guarda por partner las sumas de las aportaciones de sus facturas limpias:
+    contadores (pagadas, pendientes, vencidas, puntuales), importes, suma de
+    días de retraso y los mismos contadores separados en período reciente y
+    anterior para la tendencia. ``ClientInfo``, el risk score y
+    ``ClientTrend`` se derivan de esas sumas sin volver a recorrer facturas.
+
+    ``apply`` actualiza la tabla con un delta: resta la aportación anterior de
+    cada factura modificada o eliminada y suma la nueva, así que el coste es
+    proporcional al número de cambios. El resultado coincide con reconstruir
+    la tabla desde cero, salvo el redondeo de las sumas de importes tras
+    restar.
+
+    Attributes:
+        cutoff_ts (pd.Timestamp): Fecha de corte para facturas vencidas.
+        recent_months (int): Meses que forman el período reciente de la tendencia.
+    """
+
+    def __init__(self, cutoff_ts, recent_months: int = PARTNER_STATS_RECENT_MONTHS):
+        self.cutoff_ts = pd.Timestamp(cutoff_ts)
+        self.recent_months = recent_months
+        self.recent_start = self.cutoff_ts - pd.DateOffset(months=recent_months)
+        # Aportación de cada factura, indexada por id de factura
+        self._contributions = self._empty_contributions()
+        # Sumas por partner, en orden de aparición
+        self._totals = self._contributions[_SUM_COLUMNS].rename_axis('partner_id')
+        self._names = pd.Series(index=self._totals.index, dtype=object)
+        # Estadísticas y tendencias derivadas de las sumas (se recalculan tras cada cambio)
+        self._stats: Optional[pd.DataFrame] = None
+        self._trends: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def from_invoices(cls, invoices_df: pd.DataFrame, cutoff_ts,
+                      recent_months: int = PARTNER_STATS_RECENT_MONTHS) -> 'PartnerStatsTable':
+        """Construye la tabla a partir de facturas limpias (ej. el libro completo)."""
+        table = cls(cutoff_ts, recent_months)
+        table.apply(invoices_df)
+        return table
+
+    # =========================================================================
+    # ACTUALIZACIÓN
+    # =========================================================================
+
+    def apply(self, invoices_df: pd.DataFrame = None, stale_ids: Iterable[int] = ()) -> set:
+        """Aplica un delta de facturas limpias.
+
+        Args:
+            invoices_df: Versión actual de las facturas nuevas o modificadas.
+            stale_ids: IDs de facturas cuya aportación anterior hay que retirar
+                (modificadas, eliminadas o que ya no pasan la limpieza).
+
+        Returns:
+            IDs de los partners afectados.
+        """
+        contributions = self._contributions
+        stale = contributions.index.intersection(pd.Index(list(stale_ids), dtype='int64'))
+        added = self._empty_contributions()
+        if invoices_df is not None and not invoices_df.empty:
+            added = self._invoice_contributions(invoices_df)
+            stale = stale.union(contributions.index.intersection(added.index))
+        removed = contributions.loc[stale]
+        if removed.empty and added.empty:
+            return set()
+
+        grouped_removed = removed.groupby('partner_id', sort=False)
+        grouped_added = added.groupby('partner_id', sort=False)
+        removed_totals = grouped_removed[_SUM_COLUMNS].sum()
+        added_totals = grouped_added[_SUM_COLUMNS].sum()
+
+        new_partners = added_totals.index.difference(self._totals.index, sort=False)
+        totals = self._totals.reindex(self._totals.index.append(new_partners), fill_value=0)
+        totals.loc[added_totals.index, _SUM_COLUMNS] += added_totals[_SUM_COLUMNS].to_numpy()
+        totals.loc[removed_totals.index, _SUM_COLUMNS] -= removed_totals[_SUM_COLUMNS].to_numpy()
+        totals[_COUNT_COLUMNS] = totals[_COUNT_COLUMNS].astype('int64')
+        totals[_AMOUNT_COLUMNS] = totals[_AMOUNT_COLUMNS].astype('float64')
+        self._totals = totals[totals['total_invoices'] > 0]
+
+        # Nombre: el primero conocido del partner; se completa si no lo tenía
+        names = self._names.reindex(self._totals.index)
+        names = names.fillna(grouped_added['partner_name'].first().reindex(names.index))
+        self._names = names.astype(object)
+
+        self._stats = self._trends = None
+        kept = contributions.drop(stale)
+        self._contributions = pd.concat([kept, added]) if not kept.empty else added
+        return set(removed_totals.index.tolist()) | set(added_totals.index.tolist())
+
+    def _invoice_contributions(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Calcula por columnas la aportación de cada factura a las sumas de su partner.
+
+        Las facturas sin partner no aportan nada.
+        """
+        partner_ids = df['partner_id'].to_numpy(dtype='float64', na_value=np.nan)
+        df = df[~np.isnan(partner_ids)]
+        paid = (df['payment_state'] == 'paid').to_numpy(dtype=bool, na_value=False)
+        unpaid = (df['payment_state'] == 'not_paid').to_numpy(dtype=bool, na_value=False)
+        overdue = unpaid & (df['invoice_date_due'] < self.cutoff_ts).to_numpy(dtype=bool, na_value=False)
+        recent = (df['invoice_date'] >= self.recent_start).to_numpy(dtype=bool, na_value=False)
+        # Días entre pago y vencimiento (solo pagadas): igual que _add_payment_delay_columns
+        delay = (df['payment_dates'] - df['invoice_date_due']).dt.days.to_numpy(dtype='float64', na_value=np.nan)
+        delay = np.where(paid, delay, np.nan)
+        has_delay = ~np.isnan(delay)
+        on_time = paid & has_delay & (np.nan_to_num(delay) <= 0)
+        delay_sum = np.where(has_delay, delay, 0.0)
+
+        return pd.DataFrame({
+            'partner_id': df['partner_id'].to_numpy(dtype='int64'),
+            'partner_name': df['partner_name'].to_numpy(dtype=object),
+            'total_invoices': 1,
+            'paid_invoices': paid.astype('int64'),
+            'unpaid_invoices': unpaid.astype('int64'),
+            'overdue_invoices': overdue.astype('int64'),
+            'on_time_count': on_time.astype('int64'),
+            'delay_count': has_delay.astype('int64'),
+            'recent_invoices': (paid & recent).astype('int64'),
+            'recent_on_time': (on_time & recent).astype('int64'),
+            'recent_delay_count': (has_delay & recent).astype('int64'),
+            'previous_invoices': (paid & ~recent).astype('int64'),
+            'previous_on_time': (on_time & ~recent).astype('int64'),
+            'previous_delay_count': (has_delay & ~recent).astype('int64'),
+            'total_invoiced_eur': df['amount_total_eur'].to_numpy(dtype='float64', na_value=np.nan),
+            'total_outstanding_eur': np.where(
+                unpaid, df['amount_residual_eur'].to_numpy(dtype='float64', na_value=np.nan), 0.0),
+            'delay_sum': delay_sum,
+            'recent_delay_sum': np.where(recent, delay_sum, 0.0),
+            'previous_delay_sum': np.where(recent, 0.0, delay_sum),
+        }, index=pd.Index(df['id'].to_numpy(dtype='int64'), name='id'))
+
+    @staticmethod
+    def _empty_contributions() -> pd.DataFrame:
+        columns = {'partner_id': pd.Series(dtype='int64'), 'partner_name': pd.Series(dtype=object)}
+        columns.update({c: pd.Series(dtype='int64') for c in _COUNT_COLUMNS})
+        columns.update({c: pd.Series(dtype='float64') for c in _AMOUNT_COLUMNS})
+        return pd.DataFrame(columns, index=pd.Index([], dtype='int64', name='id'))
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+
+    @property
+    def invoice_ids(self) -> list:
+        """IDs de las facturas incluidas en la tabla."""
+        return self._contributions.index.tolist()
+
+    @property
+    def partner_ids(self) -> list:
+        """Partners con al menos una factura, en orden de aparición."""
+        return self._totals.index.tolist()
+
+    def __len__(self) -> int:
+        return len(self._totals)
+
+    @staticmethod
+    def _select(frame: pd.DataFrame, partner_ids: Optional[Iterable[int]]) -> pd.DataFrame:
+        """Filas de ``partner_ids`` (en ese orden, sin repetir) o todas si es None."""
+        if partner_ids is None:
+            return frame
+        ids = dict.fromkeys(int(pid) for pid in partner_ids)
+        return frame.loc[[pid for pid in ids if pid in frame.index]]
+
+    def client_stats(self, partner_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Campos de ``ClientInfo`` y risk score por partner.
+
+        Args:
+            partner_ids: Partners a consultar (en ese orden); los que no tienen
+                facturas se omiten. Si es None, todos.
+
+        Returns:
+            DataFrame indexado por partner_id con una columna por campo de ``ClientInfo``.
+        """
+        if self._stats is None:
+            self._stats = self._derive_stats(self._totals)
+        return self._select(self._stats, partner_ids)
+
+    def _derive_stats(self, totals: pd.DataFrame) -> pd.DataFrame:
+        """Calcula los campos de ``ClientInfo`` y el risk score a partir de las sumas."""
+        stats = totals[['total_invoices', 'paid_invoices', 'unpaid_invoices', 'overdue_invoices',
+                        'total_invoiced_eur', 'total_outstanding_eur']].copy()
+        stats.insert(0, 'name', self._names.reindex(totals.index).to_numpy())
+
+        # round() de Python por partner (una fila por cliente): mismo redondeo que ClientInfo.
+        # Sumar 0.0 evita -0.0 cuando una suma queda en cero tras restar aportaciones
+        def round_to(values: pd.Series, ndigits: int) -> pd.Series:
+            return values.map(lambda value: round(value, ndigits) + 0.0)
+
+        paid = totals['paid_invoices']
+        has_paid = paid > 0
+        avg_delay = totals['delay_sum'] / totals['delay_count'].where(totals['delay_count'] > 0)
+        # El ratio ya era un float de numpy: se redondea con numpy
+        stats['on_time_ratio'] = (totals['on_time_count'] / paid).where(has_paid, 0.0).round(4)
+        stats['avg_delay_days'] = round_to(avg_delay.where(has_paid, 0.0), 2)
+        stats['total_invoiced_eur'] = round_to(stats['total_invoiced_eur'], 2)
+        stats['total_outstanding_eur'] = round_to(stats['total_outstanding_eur'], 2)
+
+        # Risk score 0-100:
+        # Factor 1: Ratio de puntualidad (40%)
+        # Factor 2: Promedio de días de retraso (30%)
+        # Factor 3: Facturas vencidas actuales (30%)
+        score = (
+            (1 - stats['on_time_ratio']) * 40
+            + np.minimum(stats['avg_delay_days'] / 60, 1.0) * 30
+            + stats['overdue_invoices'] / stats['total_invoices'] * 30
+        )
+        stats['risk_score'] = round_to(np.minimum(score, 100), 2)
+        return stats
+
+    def client_trends(self, partner_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Tendencia de pago (período reciente frente al anterior) por partner.
+
+        Los partners con menos de 4 facturas pagadas no tienen tendencia.
+
+        Args:
+            partner_ids: Partners a consultar (en ese orden). Si es None, todos.
+
+        Returns:
+            DataFrame indexado por partner_id con los campos de ``ClientTrend``.
+        """
+        if self._trends is None:
+            self._trends = self._derive_trends(self._totals)
+        return self._select(self._trends, partner_ids)
+
+    def _derive_trends(self, totals: pd.DataFrame) -> pd.DataFrame:
+        """Calcula los campos de ``ClientTrend`` a partir de las sumas."""
+
+        def period(prefix: str) -> tuple:
+            invoices = totals[f'{prefix}_invoices']
+            delay_count = totals[f'{prefix}_delay_count']
+            on_time_ratio = (totals[f'{prefix}_on_time'] / invoices.where(invoices > 0)).round(4)
+            avg_delay = (totals[f'{prefix}_delay_sum'] / delay_count.where(delay_count > 0)).round(2)
+            return invoices, on_time_ratio.fillna(0.0), avg_delay.fillna(0.0)
+
+        recent_invoices, recent_otr, recent_delay = period('recent')
+        previous_invoices, previous_otr, previous_delay = period('previous')
+        trends = pd.DataFrame({
+            'partner_name': self._names.reindex(totals.index).to_numpy(),
+            'recent_invoices': recent_invoices.astype(int),
+            'recent_on_time_ratio': recent_otr,
+            'recent_avg_delay': recent_delay,
+            'previous_invoices': previous_invoices.astype(int),
+            'previous_on_time_ratio': previous_otr,
+            'previous_avg_delay': previous_delay,
+        }, index=totals.index)
+        trends = trends[trends['recent_invoices'] + trends['previous_invoices'] >= 4]
+
+        change_otr = trends['recent_on_time_ratio'] - trends['previous_on_time_ratio']
+        change_delay = trends['recent_avg_delay'] - trends['previous_avg_delay']
+        trends['trend'] = np.select(
+            [
+                trends['previous_invoices'] == 0,
+                (change_otr > 0.05) | (change_delay < -5),
+                (change_otr < -0.05) | (change_delay > 5),
+            ],
+            ["sin_historial", "mejorando", "empeorando"],
+            default="estable"
+        )
+        trends['change_on_time_ratio'] = change_otr.round(4)
+        trends['change_avg_delay'] = change_delay.round(2)
+        return trends
@@ -0,0 +1,139 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class RateTable:
+    """Tipos de cambio a EUR con fecha de efecto, por moneda.
+
+    Cada moneda guarda dos arrays ordenados por fecha (fechas y tasas). La
+    tasa aplicable a una factura es la última con fecha de efecto menor o
+    igual que su fecha (as-of); las fechas anteriores a la primera tasa usan
+    la primera, y las fechas nulas, la última. Las tasas se expresan como EUR
+    por unidad de moneda (ej. USD -> 0.92). EUR y las monedas sin tasa no se
+    convierten.
+
+    Attributes:
+        currencies (list): Monedas con tasa.
+    """
+
+    def __init__(self, rates: pd.DataFrame = None):
+        """Crea la tabla a partir de un DataFrame con columnas currency, date y rate."""
+        self._table: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if rates is None or rates.empty:
+            return
+        rates = rates.dropna(subset=['currency', 'rate'])
+        rates = rates[rates['currency'] != 'EUR']
+        dates = pd.to_datetime(rates['date'], errors='coerce').fillna(pd.Timestamp.min)
+        rates = rates.assign(date=dates.astype('datetime64[ns]')).sort_values(['currency', 'date'], kind='stable')
+        for currency, group in rates.groupby('currency', sort=False):
+            # Con varias tasas el mismo día, gana la última
+            group = group.drop_duplicates('date', keep='last')
+            self._table[str(currency)] = (group['date'].to_numpy(), group['rate'].to_numpy(dtype=float))
+
+    # =========================================================================
+    # CARGA
+    # =========================================================================
+
+    @classmethod
+    def from_static(cls, rates: Dict[str, float]) -> 'RateTable':
+        """Tabla con una tasa fija por moneda, válida para cualquier fecha."""
+        return cls(pd.DataFrame({
+            'currency': list(rates), 'date': pd.NaT, 'rate': list(rates.values())
+        }))
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'RateTable':
+        """Carga la tabla de un CSV con columnas ``currency,date,rate`` (EUR por unidad)."""
+        return cls(pd.read_csv(path, dtype={'currency': str, 'date': str, 'rate': float}))
+
+    @classmethod
+    def from_odoo(cls, records: list, companies: list) -> 'RateTable':
+        """Carga la tabla de registros ``res.currency.rate`` de Odoo.
+
+        En Odoo ``rate`` son unidades de moneda por unidad de la moneda de la
+        compañía del registro, así que solo las tasas de compañías en EUR dan
+        la tasa a EUR (su inversa). Las de compañías en otra moneda (ej. COP o
+        MXN) o sin compañía se descartan para no mezclar bases distintas.
+
+        Args:
+            records: Registros con name (fecha), currency_id, rate y company_id.
+            companies: Registros ``res.company`` con id y currency_id.
+        """
+        eur_companies = {
+            c['id'] for c in companies
+            if isinstance(c.get('currency_id'), (list, tuple)) and c['currency_id'][1] == 'EUR'
+        }
+        rows = [
+            {'currency': r['currency_id'][1], 'date': r['name'], 'rate': 1 / r['rate']}
+            for r in records
+            if isinstance(r.get('currency_id'), (list, tuple)) and r.get('rate')
+            and isinstance(r.get('company_id'), (list, tuple)) and r['company_id'][0] in eur_companies
+        ]
+        return cls(pd.DataFrame(rows, columns=['currency', 'date', 'rate']))
+
+    def with_fallback(self, fallback: 'RateTable') -> 'RateTable':
+        """Devuelve una tabla que usa ``fallback`` para las monedas que esta no tiene."""
+        combined = RateTable()
+        combined._table = {**fallback._table, **self._table}
+        return combined
+
+    # =========================================================================
+    # CONSULTA
+    # =========================================================================
+
+    @property
+    def currencies(self) -> list:
+        return list(self._table)
+
+    @property
+    def is_static(self) -> bool:
+        """True si cada moneda tiene una sola tasa (la conversión no depende de la fecha)."""
+        return all(len(rates) == 1 for _, rates in self._table.values())
+
+    def latest(self, currency: str) -> Optional[float]:
+        """Tasa más reciente de una moneda, o None si no tiene."""
+        entry = self._table.get(currency)
+        return float(entry[1][-1]) if entry is not None else None
+
+    def rate_at(self, currencies: pd.Series, dates: pd.Series = None) -> np.ndarray:
+        """Tasa as-of para cada fila (NaN si la moneda no tiene tasa).
+
+        Args:
+            currencies: Moneda de cada fila.
+            dates: Fecha de cada fila. Si es None se usa la última tasa.
+
+        Returns:
+            Array de tasas alineado con ``currencies``.
+        """
+        result = np.full(len(currencies), np.nan)
+        if not self._table or len(currencies) == 0:
+            return result
+        if dates is None:
+            dates = pd.Series(pd.NaT, index=currencies.index)
+        day = pd.to_datetime(dates).to_numpy(dtype='datetime64[ns]')
+
+        positions = pd.Series(np.asarray(currencies, dtype=object)).groupby(
+            np.asarray(currencies, dtype=object), sort=False
+        ).indices
+        for currency, rows in positions.items():
+            entry = self._table.get(currency)
+            if entry is None:
+                continue
+            effective_dates, rates = entry
+            # NaT se ordena al final: las fechas nulas toman la última tasa
+            index = np.searchsorted(effective_dates, day[rows], side='right') - 1
+            result[rows] = rates[np.clip(index, 0, None)]
+        return result
+
+    def convert(self, amounts: pd.Series, currencies: pd.Series, dates: pd.Series = None) -> pd.Series:
+        """Convierte importes a EUR con la tasa as-of de cada fila.
+
+        Las filas sin tasa conservan el importe original.
+        """
+        rate = pd.Series(self.rate_at(currencies, dates), index=amounts.index)
+        has_rate = rate.notna()
+        if not has_rate.any():
+            return amounts
+        return amounts.where(~has_rate, amounts * rate)
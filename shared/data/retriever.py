@@ -1,70 +1,253 @@
 import asyncio
+from typing import Optional, Tuple
 from shared.clients.odoo_connector import OdooConnection
-from .config import INVOICE_FIELDS, PARTNER_FIELDS, BATCH_SIZE
+from shared.clients.odoo_jsonrpc import AsyncOdooConnection
+from .config import INVOICE_FIELDS, PARTNER_FIELDS, RATE_FIELDS, COMPANY_FIELDS, BATCH_SIZE, PAGINATION_MODE
+from .snapshot import SnapshotStore
+from shared.utils.single_flight import SingleFlight, freeze
+from shared.utils.fan_out import fan_out
 import pandas as pd
 
 
 class DataRetriever:
     """Recupera datos de facturas y clientes desde Odoo."""
 
-    def __init__(self, odoo_connection: OdooConnection, cutoff_date: str = None):
+    def __init__(self, odoo_connection: OdooConnection | AsyncOdooConnection, cutoff_date: str = None,
+                 snapshot: Optional[SnapshotStore] = None,
+                 pagination_mode: str = PAGINATION_MODE):
+        if pagination_mode not in ('offset', 'keyset'):
+            raise ValueError(f"Modo de paginación no soportado: {pagination_mode}")
         self.odoo_connection = odoo_connection
         self.cutoff_date = cutoff_date
-        self.max_concurrent_requests = 5
+        # Una petición concurrente por sesión del pool de conexiones
+        self.max_concurrent_requests = odoo_connection.pool_size
+        self.pagination_mode = pagination_mode
+        # Snapshot local opcional desde el que se sirven las consultas que cubre
+        self.snapshot = snapshot
+        self._snapshot_lock = asyncio.Lock()
+        # Descargas completas idénticas en curso se comparten entre llamantes
+        self._single_flight = SingleFlight()
+
+    async def _use_snapshot(self, model: str, domain: list, fields: list) -> bool:
+        """Indica si la consulta se sirve desde el snapshot, sincronizándolo si está desactualizado."""
+        if self.snapshot is None or model not in self.snapshot.models:
+            return False
+        if self.snapshot.is_stale():
+            async with self._snapshot_lock:
+                if self.snapshot.is_stale():
+                    try:
+                        await self.sync_snapshot()
+                    except Exception as e:
+                        print(f"Error al sincronizar el snapshot: {e}")
+        return self.snapshot.covers(model, domain, fields)
 
     async def _fetch_batch(self, model: str, domain: list, fields: list,
-                           limit: int, offset: int = 0) -> list:
-        """Recupera un batch de registros con limit y offset."""
+                           limit: int, offset: int = 0, order: str = None) -> list:
+        """Recupera un batch de registros con limit, offset y orden opcional."""
+        if await self._use_snapshot(model, domain, fields):
+            return self.snapshot.search_read(model, domain, fields, limit, offset, order)
         return await self.odoo_connection.search_read(
-            model, domain, fields, limit, offset
+            model, domain, fields, limit, offset, order=order
         )
 
     async def _fetch_all_parallel(self, model: str, domain: list, fields: list) -> list:
         """Recupera TODOS los registros.
-        """
-        first_batch = await self._fetch_batch(model, domain, fields, BATCH_SIZE, 0)
 
-        if not first_batch or len(first_batch) < BATCH_SIZE:
-            return first_batch or []
+        Las llamadas concurrentes con el mismo (modelo, dominio, campos)
+        comparten una única descarga.
+        """
+        async def _fetch():
+            if await self._use_snapshot(model, domain, fields):
+                return self.snapshot.search_read(model, domain, fields)
+            return await self._fetch_all_from_odoo(model, domain, fields)
+
+        key = (model, freeze(domain), tuple(sorted(fields)))
+        records = await self._single_flight.do(key, _fetch)
+        return list(records)
+
+    def get_single_flight_stats(self) -> dict:
+        """Devuelve los contadores de agrupación de descargas completas concurrentes."""
+        return self._single_flight.get_stats()
+
+    async def _fetch_all_from_odoo(self, model: str, domain: list, fields: list) -> list:
+        """Recupera TODOS los registros directamente de Odoo, paginando en paralelo."""
+        if self.pagination_mode == 'keyset':
+            return await self._fetch_all_keyset(model, domain, fields)
+        return await self._fetch_all_offset(model, domain, fields)
+
+    def _report_progress(self, model: str, fetched: int, total: int) -> None:
+        """Muestra el progreso de una descarga como fracción del total esperado."""
+        print(f"Recuperados {fetched}/{total} registros de {model} ({fetched / total:.0%})")
+
+    async def _count(self, model: str, domain: list) -> int:
+        """Cuenta los registros que cumplen el dominio."""
+        return await self.odoo_connection.execute_kw(model, 'search_count', [domain])
+
+    async def _fetch_all_offset(self, model: str, domain: list, fields: list) -> list:
+        """Recupera TODOS los registros con limit/offset planificando las páginas.
+
+        Cuenta los registros con ``search_count`` y lanza exactamente las
+        páginas necesarias, como mucho ``max_concurrent_requests`` a la vez.
+        """
+        total = await self._count(model, domain)
+        if total == 0:
+            return []
+
+        offsets = range(0, total, BATCH_SIZE)
+        pages = [[] for _ in offsets]
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        fetched = 0
+
+        async def _fetch_page(index: int, offset: int):
+            nonlocal fetched
+            async with semaphore:
+                pages[index] = await self.odoo_connection.search_read(
+                    model, domain, fields, BATCH_SIZE, offset, order='id asc'
+                )
+            fetched += len(pages[index])
+            if len(offsets) > 1:
+                self._report_progress(model, fetched, total)
+
+        await asyncio.gather(*[
+            _fetch_page(index, offset) for index, offset in enumerate(offsets)
+        ])
+
+        all_records = []
+        for page in pages:
+            all_records.extend(page)
+        return all_records
 
-        all_records = list(first_batch)
-        offset = BATCH_SIZE
+    async def _fetch_id_slice(self, model: str, domain: list, fields: list,
+                              after_id: int, max_id: int, on_page=None) -> list:
+        """Recupera los registros con ``after_id < id <= max_id`` paginando por id.
 
+        Args:
+            on_page: Función opcional que recibe el número de registros de cada página.
+        """
+        records = []
         while True:
-            tasks = []
-            for i in range(self.max_concurrent_requests):
-                current_offset = offset + (i * BATCH_SIZE)
-                tasks.append(self._fetch_batch(model, domain, fields, BATCH_SIZE, current_offset))
-
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            got_records = False
-            for result in results:
-                if isinstance(result, Exception):
-                    print(f"Error en batch: {result}")
-                    continue
-                if result:
-                    all_records.extend(result)
-                    got_records = True
-
-            if not got_records or any(
-                    isinstance(r, list) and len(r) < BATCH_SIZE
-                    for r in results if not isinstance(r, Exception)
-            ):
-                break
-
-            offset += self.max_concurrent_requests * BATCH_SIZE
-            print(f"Recuperados {len(all_records)} registros...")
+            slice_domain = domain + [('id', '>', after_id), ('id', '<=', max_id)]
+            batch = await self.odoo_connection.search_read(
+                model, slice_domain, fields, BATCH_SIZE, 0, order='id asc'
+            )
+            records.extend(batch)
+            if on_page is not None:
+                on_page(len(batch))
+            if len(batch) < BATCH_SIZE:
+                return records
+            after_id = batch[-1]['id']
+
+    async def _fetch_all_keyset(self, model: str, domain: list, fields: list) -> list:
+        """Recupera TODOS los registros paginando por id en vez de por offset.
+
+        La primera página se pide a la vez que el número de registros y el id
+        máximo, así que un resultado de una sola página cuesta una ronda. Si
+        hay más, el rango de ids restante se divide en tramos disjuntos (como
+        mucho ``max_concurrent_requests`` y no más que las páginas pendientes)
+        que se recorren en paralelo con ``id > último id``, de modo que cada
+        página cuesta lo mismo a cualquier profundidad. El progreso se muestra
+        como fracción del total, igual que con ``offset``.
+        """
+        total, first_batch, last = await asyncio.gather(
+            self._count(model, domain),
+            self.odoo_connection.search_read(model, domain, fields, BATCH_SIZE, 0, order='id asc'),
+            self.odoo_connection.search_read(model, domain, ['id'], 1, 0, order='id desc'),
+        )
+        if len(first_batch) < BATCH_SIZE or not last:
+            return first_batch
+
+        after_id, max_id = first_batch[-1]['id'], last[0]['id']
+        if max_id <= after_id:
+            return first_batch
+
+        pending_pages = -(-(total - len(first_batch)) // BATCH_SIZE)
+        step = -(-(max_id - after_id) // max(1, min(self.max_concurrent_requests, pending_pages)))
+        bounds = [
+            (start, min(start + step, max_id))
+            for start in range(after_id, max_id, step)
+        ]
+        fetched = len(first_batch)
+        self._report_progress(model, fetched, total)
+
+        def _on_page(count: int) -> None:
+            nonlocal fetched
+            fetched += count
+            self._report_progress(model, fetched, total)
+
+        slices = await asyncio.gather(*[
+            self._fetch_id_slice(model, domain, fields, start, end, _on_page)
+            for start, end in bounds
+        ])
 
+        all_records = list(first_batch)
+        for records in slices:
+            all_records.extend(records)
         return all_records
 
-    async def _fetch_with_optional_limit(self, model: str, domain: list,
-                                         fields: list, limit: int = None) -> list:
-        """Recupera registros con limite opcional."""
+    async def _fetch_with_optional_limit(self, model: str, domain: list, fields: list,
+                                         limit: int = None, offset: int = 0,
+                                         order: str = None) -> list:
+        """Recupera registros con limite opcional.
+
+        Con límite, la ordenación y el límite se aplican en Odoo (una sola petición).
+        """
         if limit is None or limit == 0:
             return await self._fetch_all_parallel(model, domain, fields)
         else:
-            return await self._fetch_batch(model, domain, fields, limit, 0)
+            return await self._fetch_batch(model, domain, fields, limit, offset, order)
+
+    # =========================================================================
+    # SNAPSHOT LOCAL
+    # =========================================================================
+
+    @staticmethod
+    def _changed_after(watermark: Tuple[str, int]) -> list:
+        """Términos de dominio de los registros posteriores a una marca ``(write_date, id)``.
+
+        Con el mismo ``write_date`` desempata el id, así que los registros de la
+        marca no se vuelven a descargar aunque compartan el segundo.
+        """
+        write_date, last_id = watermark
+        return [
+            '|', ('write_date', '>', write_date),
+            '&', ('write_date', '=', write_date), ('id', '>', last_id)
+        ]
+
+    async def sync_snapshot(self) -> dict:
+        """Sincroniza el snapshot local con los cambios de Odoo.
+
+        La primera vez descarga todos los registros de cada modelo; después solo
+        los posteriores a la última marca (``write_date`` mayor o, con el mismo
+        ``write_date``, ``id`` mayor), y elimina los que ya no existen en Odoo.
+
+        Returns:
+            Diccionario ``{modelo: (registros actualizados, IDs eliminados)}``.
+        """
+        if self.snapshot is None:
+            raise Exception("El DataRetriever no tiene snapshot configurado.")
+        if self.odoo_connection.client is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+
+        changes = {}
+        for model, spec in self.snapshot.models.items():
+            base_domain = list(spec['domain'])
+            fields = list(spec['fields']) + ['write_date']
+            watermark = self.snapshot.get_watermark(model)
+
+            if watermark is None:
+                records = await self._fetch_all_from_odoo(model, base_domain, fields)
+                alive_ids = [r['id'] for r in records]
+            else:
+                domain = base_domain + self._changed_after(watermark)
+                records, alive_ids = await asyncio.gather(
+                    self._fetch_all_from_odoo(model, domain, fields),
+                    self.odoo_connection.execute_kw(model, 'search', [base_domain])
+                )
+            changes[model] = await self.snapshot.apply_changes(model, records, alive_ids)
+
+            updated, deleted = changes[model]
+            print(f"Snapshot {model}: {len(updated)} actualizados, {len(deleted)} eliminados")
+        return changes
 
     # =========================================================================
     # MÉTODOS PARA RECUPERAR TODOS LOS REGISTROS DE UN MODELO
@@ -81,6 +264,72 @@ class DataRetriever:
         ]
         return await self._fetch_all_parallel('account.move', domain, INVOICE_FIELDS)
 
+    async def iter_outbound_invoice_pages(self, page_size: int = BATCH_SIZE):
+        """Recupera las facturas de salida página a página, ordenadas por id.
+
+        A diferencia de ``get_all_outbound_invoices``, no acumula todos los
+        registros: cada página (paginada por ``id > último id``) se entrega en
+        cuanto llega, para procesarla en streaming (ver ``DataCleaner.aclean_stream``).
+
+        Args:
+            page_size: Número de registros por página.
+
+        Yields:
+            Lista de facturas de cada página.
+        """
+        if self.odoo_connection.client is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+
+        domain = [
+            ('move_type', '=', 'out_invoice'),
+            ('invoice_date_due', '<=', self.cutoff_date)
+        ]
+        after_id = 0
+        while True:
+            page_domain = domain + [('id', '>', after_id)]
+            page = await self._fetch_batch('account.move', page_domain, INVOICE_FIELDS,
+                                           page_size, order='id asc')
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after_id = page[-1]['id']
+
+    async def get_outbound_invoices_changed_since(self, since: Optional[Tuple[str, int]] = None) -> list:
+        """Recupera las facturas de salida posteriores a la marca ``since`` (incluye ``write_date``).
+
+        Args:
+            since: Marca ``(write_date, id)`` de la última sincronización: se
+                recuperan las facturas con ``write_date`` mayor o, con el mismo
+                ``write_date``, con id mayor. Si es None, recupera todas.
+
+        Returns:
+            Lista de facturas con los campos habituales más ``write_date``.
+        """
+        if self.odoo_connection.client is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+
+        domain = [
+            ('move_type', '=', 'out_invoice'),
+            ('invoice_date_due', '<=', self.cutoff_date)
+        ]
+        if since:
+            domain += self._changed_after(since)
+        return await self._fetch_all_parallel('account.move', domain, INVOICE_FIELDS + ['write_date'])
+
+    async def get_outbound_invoice_ids(self) -> list[int]:
+        """Recupera los IDs de todas las facturas de salida (para detectar eliminadas)."""
+        if self.odoo_connection.client is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+
+        domain = [
+            ('move_type', '=', 'out_invoice'),
+            ('invoice_date_due', '<=', self.cutoff_date)
+        ]
+        if await self._use_snapshot('account.move', domain, ['id']):
+            return [r['id'] for r in self.snapshot.search_read('account.move', domain, ['id'])]
+        return await self.odoo_connection.execute_kw('account.move', 'search', [domain])
+
     async def get_all_customer_partners(self) -> list:
         """Recupera TODOS los partners (clientes)."""
         if self.odoo_connection.client is None:
@@ -89,6 +338,14 @@ class DataRetriever:
         domain = [('customer_rank', '>', '0')]
         return await self._fetch_all_parallel('res.partner', domain, PARTNER_FIELDS)
 
+    async def get_currency_rates(self) -> list:
+        """Recupera el histórico de tipos de cambio (res.currency.rate)."""
+        return await self._fetch_all_parallel('res.currency.rate', [], RATE_FIELDS)
+
+    async def get_companies(self) -> list:
+        """Recupera las compañías con su moneda (res.company)."""
+        return await self._fetch_all_parallel('res.company', [], COMPANY_FIELDS)
+
     async def get_all_unpaid_invoices(self, limit: int = None) -> list:
         """Recupera facturas pendientes de pago.
 
@@ -105,12 +362,15 @@ class DataRetriever:
         ]
         return await self._fetch_with_optional_limit('account.move', domain, INVOICE_FIELDS, limit)
 
-    async def get_all_overdue_invoices(self, min_days_overdue: int = 1, limit: int = None) -> list:
+    async def get_all_overdue_invoices(self, min_days_overdue: int = 1, limit: int = None,
+                                       offset: int = 0, order: str = None) -> list:
         """Recupera facturas vencidas.
 
         Args:
             min_days_overdue: Mínimo de días vencidos para incluir.
             limit: Si es None o 0, recupera TODAS. Si > 0, recupera ese máximo.
+            offset: Desplazamiento inicial (solo con limit).
+            order: Ordenación en Odoo (solo con limit), ej. ``'invoice_date_due asc'``.
         """
         if self.odoo_connection.client is None:
             raise Exception("El cliente no está conectado a Odoo.")
@@ -123,7 +383,9 @@ class DataRetriever:
             ('payment_state', 'in', ['not_paid', 'partial']),
             ('invoice_date_due', '<=', max_due_date)
         ]
-        return await self._fetch_with_optional_limit('account.move', domain, INVOICE_FIELDS, limit)
+        return await self._fetch_with_optional_limit(
+            'account.move', domain, INVOICE_FIELDS, limit, offset, order
+        )
 
     # =========================================================================
     # MÉTODOS DE BÚSQUEDA (normalmente devuelven pocos resultados)
@@ -238,6 +500,56 @@ class DataRetriever:
 
         return list(partner_ids)
 
+    # =========================================================================
+    # MÉTODOS DE AGREGACIÓN EN SERVIDOR (read_group)
+    # =========================================================================
+
+    async def _read_group(self, model: str, domain: list, fields: list, groupby: list) -> list:
+        """Ejecuta ``read_group`` en Odoo sin agrupación perezosa."""
+        return await self.odoo_connection.execute_kw(
+            model, 'read_group', [domain, fields, groupby], {'lazy': False}
+        )
+
+    async def get_unpaid_amounts_by_due_range(self, ranges: list, base_domain: list,
+                                              groupby: list = None) -> dict:
+        """Suma el residual de facturas pendientes por rango de vencimiento, agrupado en Odoo.
+
+        Lanza un ``read_group`` por rango (en paralelo), de modo que solo viajan
+        unas pocas filas agregadas en vez de todas las facturas.
+
+        Args:
+            ranges: Lista de tuplas ``(etiqueta, desde, hasta)`` con fechas
+                ``YYYY-MM-DD`` inclusivas sobre ``invoice_date_due``. ``None``
+                deja el extremo abierto.
+            base_domain: Dominio adicional con los filtros de limpieza.
+            groupby: Campos de agrupación. Por defecto ``['currency_id']``.
+
+        Returns:
+            Diccionario ``{etiqueta: filas de read_group}``. Cada fila incluye
+            los campos agrupados, ``amount_residual`` (suma) y ``__count``.
+        """
+        if self.odoo_connection.client is None:
+            raise Exception("El cliente no está conectado a Odoo.")
+
+        groupby = groupby or ['currency_id']
+        domain = [('move_type', '=', 'out_invoice')] + list(base_domain)
+
+        async def _group_range(date_range: tuple) -> list:
+            _, start, end = date_range
+            range_domain = list(domain)
+            if start is not None:
+                range_domain.append(('invoice_date_due', '>=', start))
+            if end is not None:
+                range_domain.append(('invoice_date_due', '<=', end))
+            return await self._read_group(
+                'account.move', range_domain, ['amount_residual:sum'], groupby
+            )
+
+        # Con muchos buckets de aging, como mucho una consulta por sesión del pool
+        grouped = await fan_out(ranges, _group_range, limit=self.max_concurrent_requests)
+        grouped.raise_for_errors()
+        return {label: rows for (label, _, _), rows in zip(ranges, grouped.results)}
+
     # =========================================================================
     # MÉTODOS DE CONSULTA POR FECHAS
     # =========================================================================
@@ -257,8 +569,18 @@ class DataRetriever:
         return await self._fetch_all_parallel('account.move', domain, INVOICE_FIELDS)
 
     async def get_invoices_due_between(self, start_date: str, end_date: str,
-                                       only_unpaid: bool = True) -> list:
-        """Recupera TODAS las facturas con vencimiento entre dos fechas."""
+                                       only_unpaid: bool = True, limit: int = None,
+                                       offset: int = 0, order: str = None) -> list:
+        """Recupera las facturas con vencimiento entre dos fechas.
+
+        Args:
+            start_date: Fecha inicial de vencimiento (inclusive).
+            end_date: Fecha final de vencimiento (inclusive).
+            only_unpaid: Solo facturas pendientes de pago.
+            limit: Si es None o 0, recupera TODAS. Si > 0, recupera ese máximo.
+            offset: Desplazamiento inicial (solo con limit).
+            order: Ordenación en Odoo (solo con limit).
+        """
         if self.odoo_connection.client is None:
             raise Exception("El cliente no está conectado a Odoo.")
 
@@ -270,7 +592,9 @@ class DataRetriever:
         if only_unpaid:
             domain.append(('payment_state', 'in', ['not_paid', 'partial']))
 
-        return await self._fetch_all_parallel('account.move', domain, INVOICE_FIELDS)
+        return await self._fetch_with_optional_limit(
+            'account.move', domain, INVOICE_FIELDS, limit, offset, order
+        )
 
     async def get_invoices_by_period(self, start_date: str, end_date: str,
                                      partner_id: int = None, only_unpaid: bool = False) -> list:
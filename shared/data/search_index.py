@@ -0,0 +1,138 @@
+import re
+import unicodedata
+from typing import Iterable, List, Set, Tuple
+
+import numpy as np
+
+from .config import PARTNER_SEARCH_MIN_SIMILARITY
+
+
+def fold(text: str) -> str:
+    """Normaliza un nombre para compararlo: sin acentos, en minúsculas y solo palabras.
+
+    Ej. ``'Telefónica, S.A.'`` -> ``'telefonica s a'``.
+    """
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def trigrams(folded: str) -> Set[str]:
+    """Trigramas de cada palabra de un texto normalizado, con relleno en los extremos.
+
+    El relleno (``'  ab '``) hace que el inicio y el final de cada palabra
+    pesen más y que las palabras cortas también tengan trigramas.
+    """
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class PartnerSearchIndex:
+    """Índice en memoria para buscar partners por nombre con tolerancia a errores.
+
+    Combina dos búsquedas sobre los nombres normalizados con ``fold``:
+
+    - Subcadena: los partners cuyo nombre contiene la consulta (lo mismo que
+      devolvería ``ilike`` en Odoo, pero sin distinguir acentos) van primero.
+    - Trigramas: un índice invertido trigrama -> partners da, para cada
+      partner, cuántos trigramas comparte con la consulta. Los que superan
+      ``min_similarity`` se devuelven después, así que las erratas
+      (``'telfonica'``) también encuentran el partner.
+
+    Attributes:
+        min_similarity (float): Similitud mínima (0-1) de los resultados aproximados.
+    """
+
+    def __init__(self, partners: Iterable[Tuple[int, str]],
+                 min_similarity: float = PARTNER_SEARCH_MIN_SIMILARITY):
+        """Construye el índice.
+
+        Args:
+            partners: Pares (id, nombre). Los nombres vacíos se ignoran.
+            min_similarity: Similitud mínima de los resultados aproximados.
+        """
+        self.min_similarity = min_similarity
+        records = [(int(pid), name) for pid, name in partners if isinstance(name, str) and name.strip()]
+        self._ids = np.array([pid for pid, _ in records], dtype=np.int64)
+        self._names = [name for _, name in records]
+        self._folded = folded = [fold(name) for name in self._names]
+
+        postings = {}
+        gram_counts = np.zeros(len(records), dtype=np.int64)
+        for position, text in enumerate(folded):
+            grams = trigrams(text)
+            gram_counts[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self._postings = {gram: np.array(positions, dtype=np.int64) for gram, positions in postings.items()}
+        self._gram_counts = gram_counts
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, str, float]]:
+        """Busca los partners más parecidos a ``query``.
+
+        Args:
+            query: Nombre o parte del nombre.
+            limit: Máximo número de resultados.
+
+        Returns:
+            Lista de (id, nombre, similitud) ordenada de mejor a peor. Las
+            coincidencias por subcadena tienen similitud mayor que 1.
+        """
+        folded = fold(query)
+        if not folded or not self._names:
+            return []
+
+        # Trigramas compartidos con la consulta, solo de los partners que tienen alguno
+        query_grams = trigrams(folded)
+        size = len(query_grams)
+        hits = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._names)) if hits else \
+            np.zeros(len(self._names), dtype=np.int64)
+        # Mínimo de trigramas compartidos con el que se puede llegar a min_similarity
+        min_shared = next((k for k in range(1, size + 1) if self._similarity(k, size, k) >= self.min_similarity),
+                          size + 1)
+        contains = np.zeros(len(self._names), dtype=bool)
+        contains[self._containing(folded)] = True
+
+        candidates = np.flatnonzero(contains | (shared >= min_shared))
+        if candidates.size == 0:
+            return []
+        similarity = self._similarity(shared[candidates], size, self._gram_counts[candidates])
+        keep = contains[candidates]
+        score = np.where(keep, similarity + 1, similarity)
+        keep |= similarity >= self.min_similarity
+        candidates, score = candidates[keep], score[keep]
+
+        # Mayor puntuación primero; a igualdad, el id más bajo
+        order = np.lexsort((self._ids[candidates], -score))[:limit]
+        return [
+            (int(self._ids[candidates[i]]), self._names[candidates[i]], round(float(score[i]), 4))
+            for i in order
+        ]
+
+    @staticmethod
+    def _similarity(shared, query_size: int, name_size):
+        """Media entre la parte de la consulta encontrada y el coeficiente de Dice."""
+        return (shared / query_size + 2 * shared / (query_size + name_size)) / 2
+
+    def _containing(self, folded: str) -> np.ndarray:
+        """Posiciones de los partners cuyo nombre normalizado contiene ``folded``.
+
+        Un nombre que contiene la consulta tiene también cada trigrama interior
+        de sus palabras, así que solo se comprueban los partners del trigrama
+        menos frecuente. Si la consulta no tiene ninguno (palabras de menos de
+        3 letras) se recorren todos los nombres.
+        """
+        inner = {word[i:i + 3] for word in folded.split() for i in range(len(word) - 2)}
+        if not inner:
+            return np.array([i for i, name in enumerate(self._folded) if folded in name], dtype=np.int64)
+        if any(gram not in self._postings for gram in inner):
+            return np.array([], dtype=np.int64)
+        rarest = min((self._postings[gram] for gram in inner), key=len)
+        return np.array([i for i in rarest.tolist() if folded in self._folded[i]], dtype=np.int64)
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from shared.utils.odoo_domain import match_domain, domain_fields, sort_records, split_domain
+from .config import SNAPSHOT_MODELS
+
+
+def _term_key(term) -> tuple:
+    """Normaliza un término de dominio a una tupla hashable para poder compararlo."""
+    field, operator, value = term
+    if isinstance(value, list):
+        value = tuple(value)
+    return field, operator, value
+
+
+def _index_key(record: dict, field: str) -> Any:
+    """Valor de un campo para el índice (los many2one se indexan por id)."""
+    value = record.get(field, False)
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else False
+    return value
+
+
+def _is_id(value: Any) -> bool:
+    """True si el valor es un entero que puede buscarse directamente en un índice."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class SnapshotStore:
+    """Copia local persistente (SQLite) de facturas y partners de Odoo.
+
+    Se carga una vez desde disco y después solo se sincronizan los registros
+    posteriores a la última marca de sincronización (``write_date`` y, a
+    igualdad, ``id``). Responde a ``search_read`` evaluando el dominio en
+    local; los términos ``=``/``in`` sobre ``id`` y los campos indexados
+    reducen los candidatos antes de evaluarlo.
+
+    Attributes:
+        path (str): Ruta del fichero SQLite.
+        models (dict): Modelos replicados con su dominio base y campos.
+        max_age (float): Segundos tras los que el snapshot se considera desactualizado.
+    """
+
+    def __init__(self, path: str, max_age: float = 300, models: dict = None):
+        self.path = path
+        self.max_age = max_age
+        self.models = models or SNAPSHOT_MODELS
+        self._records: Dict[str, Dict[int, dict]] = {model: {} for model in self.models}
+        self._watermarks: Dict[str, Optional[str]] = {model: None for model in self.models}
+        # Mayor id con write_date igual a la marca: desempate de la sincronización
+        self._watermark_ids: Dict[str, int] = {model: 0 for model in self.models}
+        # Índices {modelo: {campo: {valor: ids}}} y ids ordenados (None si hay que recalcularlos)
+        self._indexes: Dict[str, Dict[str, Dict[Any, Set[int]]]] = {
+            model: {field: {} for field in spec.get('index', [])}
+            for model, spec in self.models.items()
+        }
+        self._sorted_ids: Dict[str, Optional[List[int]]] = {model: None for model in self.models}
+        self._synced_at: Dict[str, float] = {}
+
+    # =========================================================================
+    # PERSISTENCIA
+    # =========================================================================
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                model TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                write_date TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (model, id)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                model TEXT PRIMARY KEY,
+                watermark TEXT
+            )
+        """)
+        return conn
+
+    async def load(self) -> None:
+        """Carga el snapshot desde disco."""
+        def _load():
+            with self._connect() as conn:
+                rows = conn.execute("SELECT model, data FROM records").fetchall()
+                state = conn.execute("SELECT model, watermark FROM sync_state").fetchall()
+            return rows, state
+
+        rows, state = await asyncio.to_thread(_load)
+        for model, data in rows:
+            if model in self._records:
+                self._put(model, json.loads(data))
+        for model, watermark in state:
+            if model in self._watermarks:
+                self._watermarks[model] = watermark
+                self._watermark_ids[model] = max(
+                    (record_id for record_id, record in self._records[model].items()
+                     if record.get('write_date') == watermark),
+                    default=0
+                )
+
+    def _persist(self, model: str, records: List[dict], deleted_ids: List[int]) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (model, id, write_date, data) VALUES (?, ?, ?, ?)",
+                [(model, r['id'], r.get('write_date') or None, json.dumps(r)) for r in records]
+            )
+            conn.executemany(
+                "DELETE FROM records WHERE model = ? AND id = ?",
+                [(model, record_id) for record_id in deleted_ids]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (model, watermark) VALUES (?, ?)",
+                (model, self._watermarks[model])
+            )
+
+    # =========================================================================
+    # SINCRONIZACIÓN
+    # =========================================================================
+
+    def get_watermark(self, model: str) -> Optional[Tuple[str, int]]:
+        """Devuelve la marca de sincronización de un modelo.
+
+        Returns:
+            Tupla (``write_date`` máximo, mayor id con ese ``write_date``) o
+            None si el modelo no se ha sincronizado nunca.
+        """
+        if self._watermarks.get(model) is None:
+            return None
+        return self._watermarks[model], self._watermark_ids[model]
+
+    def is_stale(self) -> bool:
+        """Indica si algún modelo no se ha sincronizado en los últimos ``max_age`` segundos."""
+        now = time.monotonic()
+        return any(
+            now - self._synced_at.get(model, float('-inf')) > self.max_age
+            for model in self.models
+        )
+
+    async def apply_changes(self, model: str, records: List[dict],
+                            alive_ids: List[int] = None) -> Tuple[List[dict], List[int]]:
+        """Aplica al snapshot los registros modificados desde la última sincronización.
+
+        Args:
+            model: Modelo de Odoo.
+            records: Registros nuevos o modificados (deben incluir ``write_date``).
+            alive_ids: IDs que siguen existiendo en Odoo. Si se indica, se
+                eliminan del snapshot los que ya no están.
+
+        Returns:
+            Tupla con (registros actualizados, IDs eliminados).
+        """
+        store = self._records[model]
+        for record in records:
+            self._put(model, record)
+            write_date = record.get('write_date')
+            if not write_date:
+                continue
+            if self._watermarks[model] is None or write_date > self._watermarks[model]:
+                self._watermarks[model] = write_date
+                self._watermark_ids[model] = record['id']
+            elif write_date == self._watermarks[model]:
+                self._watermark_ids[model] = max(self._watermark_ids[model], record['id'])
+
+        deleted_ids = []
+        if alive_ids is not None:
+            alive = set(alive_ids)
+            deleted_ids = [record_id for record_id in store if record_id not in alive]
+            for record_id in deleted_ids:
+                self._drop(model, record_id)
+
+        await asyncio.to_thread(self._persist, model, records, deleted_ids)
+        self._synced_at[model] = time.monotonic()
+        return records, deleted_ids
+
+    # =========================================================================
+    # ÍNDICES
+    # =========================================================================
+
+    def _put(self, model: str, record: dict) -> None:
+        """Guarda (o reemplaza) un registro manteniendo los índices."""
+        previous = self._records[model].get(record['id'])
+        if previous is None:
+            self._sorted_ids[model] = None
+        else:
+            self._unindex(model, previous)
+        self._records[model][record['id']] = record
+        for field, index in self._indexes[model].items():
+            key = _index_key(record, field)
+            if key is not False and key is not None:
+                index.setdefault(key, set()).add(record['id'])
+
+    def _drop(self, model: str, record_id: int) -> None:
+        """Elimina un registro y sus entradas en los índices."""
+        self._unindex(model, self._records[model].pop(record_id))
+        self._sorted_ids[model] = None
+
+    def _unindex(self, model: str, record: dict) -> None:
+        """Quita un registro de los índices del modelo."""
+        for field, index in self._indexes[model].items():
+            key = _index_key(record, field)
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(record['id'])
+                if not ids:
+                    del index[key]
+
+    def _ids(self, model: str) -> List[int]:
+        """IDs del modelo en orden ascendente (se recalculan solo tras altas o bajas)."""
+        if self._sorted_ids[model] is None:
+            self._sorted_ids[model] = sorted(self._records[model])
+        return self._sorted_ids[model]
+
+    def _candidates(self, model: str, domain: list) -> Optional[Set[int]]:
+        """IDs que pueden cumplir el dominio según los términos ``=``/``in`` indexables.
+
+        Solo se usan los términos de primer nivel, que se combinan con ``&``,
+        así que basta con intersecar los IDs de cada término indexable.
+
+        Returns:
+            Conjunto de IDs candidatos o None si ningún término usa un índice.
+        """
+        store = self._records[model]
+        indexes = self._indexes[model]
+        candidates = None
+        for part in split_domain(domain):
+            if len(part) != 1:
+                continue
+            field, operator, value = part[0]
+            if field != 'id' and field not in indexes:
+                continue
+            if operator in ('=', '==') and _is_id(value):
+                values = [value]
+            elif operator == 'in' and isinstance(value, (list, tuple)) and all(_is_id(v) for v in value):
+                values = value
+            else:
+                continue
+            if field == 'id':
+                ids = {v for v in values if v in store}
+            else:
+                ids = set().union(*(indexes[field].get(v, ()) for v in values))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        return candidates
+
+    # =========================================================================
+    # CONSULTA
+    # =========================================================================
+
+    def _residual_domain(self, model: str, domain: list) -> Optional[list]:
+        """Quita del dominio los términos base del modelo.
+
+        Los términos base deben estar en el primer nivel del dominio; el resto
+        puede usar ``|``, ``&`` y ``!`` (ej. el cursor de sincronización).
+
+        Returns:
+            Dominio restante o None si el snapshot no puede responderlo.
+        """
+        try:
+            parts = split_domain(domain)
+        except ValueError:
+            return None
+        if any(len(part) == 1 and not isinstance(part[0], (list, tuple)) for part in parts):
+            return None
+        base = {_term_key(term) for term in self.models[model]['domain']}
+        top_level = {_term_key(part[0]) for part in parts if len(part) == 1}
+        if not base.issubset(top_level):
+            return None
+        return [item for part in parts
+                if not (len(part) == 1 and _term_key(part[0]) in base)
+                for item in part]
+
+    def covers(self, model: str, domain: list, fields: list = ()) -> bool:
+        """Indica si una consulta puede resolverse con el snapshot.
+
+        Solo se cubren consultas sobre modelos sincronizados, que incluyan el
+        dominio base y que usen campos almacenados.
+        """
+        if model not in self.models or model not in self._synced_at:
+            return False
+        residual = self._residual_domain(model, domain)
+        if residual is None:
+            return False
+        stored = set(self.models[model]['fields']) | {'id', 'write_date'}
+        return domain_fields(residual).issubset(stored) and set(fields).issubset(stored)
+
+    def search_read(self, model: str, domain: list, fields: list,
+                    limit: int = 0, offset: int = 0, order: str = None) -> List[dict]:
+        """Equivalente local a ``search_read`` de Odoo (por defecto ordenado por id)."""
+        residual = self._residual_domain(model, domain) or []
+        store = self._records[model]
+        candidates = self._candidates(model, residual)
+        ids = self._ids(model) if candidates is None else sorted(candidates)
+        matched = [store[record_id] for record_id in ids if match_domain(store[record_id], residual)]
+        if order:
+            matched = sort_records(matched, order)
+        matched = matched[offset:offset + limit] if limit else matched[offset:]
+        fields = list(dict.fromkeys(['id', *fields]))
+        return [{field: record.get(field, False) for field in fields} for record in matched]
@@ -0,0 +1,95 @@
+from typing import Any, List
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter
+
+from shared.models.domain import InvoiceSummary
+
+# Validador de la lista completa: una sola llamada valida todas las filas
+_INVOICE_SUMMARY_LIST = TypeAdapter(List[InvoiceSummary])
+
+
+def amount_by_state(df: pd.DataFrame) -> pd.Series:
+    """Importe a mostrar por factura: amount_total si está pagada, amount_residual si no."""
+    paid = (df['payment_state'] == 'paid').to_numpy()
+    amounts = np.where(paid, df['amount_total_eur'].to_numpy(dtype=float),
+                       df['amount_residual_eur'].to_numpy(dtype=float))
+    return pd.Series(amounts, index=df.index)
+
+
+def days_overdue_at(due_dates: pd.Series, cutoff: pd.Timestamp) -> pd.Series:
+    """Días de vencimiento a ``cutoff`` (nulo si la factura aún no ha vencido o no tiene fecha)."""
+    days = (cutoff - due_dates).dt.days
+    return days.where(due_dates < cutoff)
+
+
+def build_invoice_summaries(df: pd.DataFrame, amount_eur: pd.Series,
+                            days_overdue: pd.Series = None,
+                            payment_state: Any = None,
+                            partner_id: Any = None,
+                            with_payment_info: bool = False,
+                            with_partner_name: bool = False) -> List[InvoiceSummary]:
+    """Convierte facturas limpias en ``InvoiceSummary`` por columnas.
+
+    Cada campo se calcula de una vez para toda la columna (fechas, enteros
+    nulables, redondeo) y las filas se validan juntas con un único
+    ``TypeAdapter``, en lugar de recorrer el DataFrame con ``iterrows``.
+
+    Args:
+        df: Facturas limpias.
+        amount_eur: Importe a mostrar por factura (ver ``amount_by_state``).
+        days_overdue: Días de vencimiento por factura (nulos permitidos).
+        payment_state: Estado fijo para todas las filas; si es None se usa la columna.
+        partner_id: Partner fijo para todas las filas; si es None se usa la columna.
+        with_payment_info: Incluir payment_date, paid_late y delay_days.
+        with_partner_name: Incluir partner_name.
+
+    Returns:
+        Lista de ``InvoiceSummary`` en el orden de ``df``.
+    """
+    if df.empty:
+        return []
+    n = len(df)
+    columns = {
+        'id': df['id'].to_numpy(dtype=np.int64).tolist(),
+        'name': df['name'].tolist(),
+        'amount_eur': [round(amount, 2) for amount in amount_eur.to_numpy(dtype=float).tolist()],
+        'invoice_date': _dates(df['invoice_date']),
+        'due_date': _dates(df['invoice_date_due']),
+        'payment_state': [payment_state] * n if payment_state is not None else df['payment_state'].tolist(),
+        'days_overdue': _ints(days_overdue) if days_overdue is not None else [None] * n,
+        'partner_id': [partner_id] * n if partner_id is not None else _ints(df['partner_id']),
+    }
+    if with_payment_info:
+        columns['payment_date'] = _dates(df['payment_dates']) if 'payment_dates' in df else [None] * n
+        columns['paid_late'] = _bools(df['paid_late']) if 'paid_late' in df else [None] * n
+        columns['delay_days'] = (
+            _ints(df['payment_overdue_days']) if 'payment_overdue_days' in df else [None] * n
+        )
+    if with_partner_name:
+        columns['partner_name'] = _nullable(df['partner_name'], df['partner_name'].tolist())
+
+    keys = list(columns)
+    records = [dict(zip(keys, values)) for values in zip(*columns.values())]
+    return _INVOICE_SUMMARY_LIST.validate_python(records)
+
+
+def _nullable(values: pd.Series, converted: list) -> list:
+    """Sustituye por None los elementos de ``converted`` cuyo valor original es nulo."""
+    missing = values.isna().to_numpy()
+    if not missing.any():
+        return converted
+    return [None if is_missing else value for value, is_missing in zip(converted, missing)]
+
+
+def _dates(values: pd.Series) -> list:
+    return _nullable(values, pd.to_datetime(values).dt.date.tolist())
+
+
+def _ints(values: pd.Series) -> list:
+    return _nullable(values, values.to_numpy(dtype=np.int64, na_value=0).tolist())
+
+
+def _bools(values: pd.Series) -> list:
+    return _nullable(values, [bool(value) for value in values.fillna(False).tolist()])
@@ -68,18 +68,33 @@ class PredictionResult(BaseModel):
 
 class AgingBucket(BaseModel):
     """Bucket del aging report."""
-    range_label: str  # "0-30", "31-60", "61-90", ">90"
+    range_label: str  # "0-30", "31-60", "61-90", ">90" (con los límites por defecto)
     invoice_count: int
     total_amount_eur: float
     percentage: float
 
 
+class AgingGroup(BaseModel):
+    """Aging de un grupo (compañía o moneda) dentro del aging report."""
+    name: str
+    total_overdue_eur: float
+    total_overdue_count: int
+    buckets: list[AgingBucket]
+
+
+class AgingGroupBy(str, Enum):
+    COMPANY = "company"
+    CURRENCY = "currency"
+
+
 class AgingReport(BaseModel):
     """Informe de antigüedad de deuda."""
     total_overdue_eur: float
     total_overdue_count: int
     buckets: list[AgingBucket]
     generated_at: date
+    group_by: Optional[AgingGroupBy] = None
+    groups: Optional[list[AgingGroup]] = None  # Desglose si se indica group_by
 
 
 class PortfolioSummary(BaseModel):
@@ -162,6 +177,8 @@ class ChartType(str, Enum):
 class GetAgingReportInput(BaseModel):
     """Input para aging report."""
     partner_id: Optional[int] = Field(default=None, description="ID del cliente (opcional). Si no se especifica, genera aging de toda la cartera.")
+    bucket_edges: Optional[list[int]] = Field(default=None, description="Límites de los buckets en días vencidos (ej. [0, 15, 30, 60, 90, 180, 365]). Por defecto 0-30-60-90.")
+    group_by: Optional[AgingGroupBy] = Field(default=None, description="Desglose opcional del aging: 'company' (compañía) o 'currency' (moneda).")
 
 class PredictHypotheticalInput(BaseModel):
     """Input para predecir riesgo de una factura hipotética."""
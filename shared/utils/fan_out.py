@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class FanOutResult:
+    """Resultado de ``fan_out``: un resultado por elemento, en el orden de entrada.
+
+    Attributes:
+        items (list): Elementos procesados.
+        results (list): Resultado de cada elemento (None si falló).
+        errors (dict): Excepción de cada elemento fallido, por posición.
+    """
+
+    def __init__(self, items: List[Any], results: List[Any], errors: Dict[int, BaseException]):
+        self.items = items
+        self.results = results
+        self.errors = errors
+
+    @property
+    def ok(self) -> bool:
+        """True si no ha fallado ningún elemento."""
+        return not self.errors
+
+    @property
+    def succeeded(self) -> List[Any]:
+        """Resultados de los elementos sin error, en orden."""
+        return [result for index, result in enumerate(self.results) if index not in self.errors]
+
+    @property
+    def failed(self) -> List[Tuple[Any, BaseException]]:
+        """Pares (elemento, excepción) de los elementos fallidos, en orden.
+
+        Es una lista y no un dict porque los elementos pueden no ser hashables
+        (ej. bloques de IDs).
+        """
+        return [(self.items[index], error) for index, error in sorted(self.errors.items())]
+
+    def raise_for_errors(self) -> None:
+        """Relanza el error del primer elemento fallido, si lo hay."""
+        if self.errors:
+            raise self.errors[min(self.errors)]
+
+
+async def fan_out(items: Iterable[Any], func: Callable[[Any], Awaitable[Any]],
+                  limit: int = 5, timeout: Optional[float] = None) -> FanOutResult:
+    """Ejecuta ``func(item)`` para cada elemento con concurrencia acotada.
+
+    Como mucho ``limit`` llamadas están en curso a la vez (semáforo), así que
+    la latencia total se acerca a la de la tarea más lenta sin saturar Odoo.
+    El fallo o el timeout de un elemento no cancela los demás: se recoge en
+    ``FanOutResult.errors`` y el resto de resultados se conserva.
+
+    Args:
+        items: Elementos a procesar (ej. IDs de partners o facturas).
+        func: Función asíncrona que procesa un elemento.
+        limit: Máximo de llamadas concurrentes.
+        timeout: Segundos máximos por llamada (sin contar la espera al semáforo).
+            None para no limitar.
+
+    Returns:
+        FanOutResult con los resultados en el orden de ``items``.
+    """
+    if limit < 1:
+        raise ValueError(f"El límite de concurrencia debe ser >= 1: {limit}")
+    items = list(items)
+    results: List[Any] = [None] * len(items)
+    errors: Dict[int, BaseException] = {}
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run(index: int, item: Any) -> None:
+        async with semaphore:
+            try:
+                if timeout is None:
+                    results[index] = await func(item)
+                else:
+                    results[index] = await asyncio.wait_for(func(item), timeout)
+            except Exception as e:  # incluye asyncio.TimeoutError
+                errors[index] = e
+
+    await asyncio.gather(*[_run(index, item) for index, item in enumerate(items)])
+    return FanOutResult(items, results, errors)
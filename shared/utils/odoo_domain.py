@@ -0,0 +1,170 @@
+from typing import Any
+
+
+def _field_value(record: dict, field: str) -> Any:
+    """Obtiene el valor de un campo del registro.
+
+    Los many2one de Odoo llegan como ``[id, nombre]``: se comparan por id,
+    salvo que el campo sea ``*_id.name``, en cuyo caso se usa el nombre.
+    """
+    base, _, subfield = field.partition('.')
+    value = record.get(base, False)
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return value[1] if subfield == 'name' else value[0]
+    return value
+
+
+def _coerce(value: Any, other: Any) -> Any:
+    """Adapta ``other`` al tipo de ``value`` cuando Odoo permite mezclarlos (ej. ``'0'`` vs ``0``)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(other, str):
+        try:
+            return float(other)
+        except ValueError:
+            return other
+    return other
+
+
+def match_term(record: dict, term) -> bool:
+    """Evalúa un término ``(campo, operador, valor)`` sobre un registro.
+
+    Sigue la semántica SQL de Odoo: los valores vacíos (``False``/``None``)
+    no cumplen comparaciones, salvo ``= False``, ``!=``, ``not in``, ``not like``
+    y ``not ilike``.
+    """
+    field, operator, value = term
+    current = _field_value(record, field)
+    is_null = current is False or current is None
+
+    if operator in ('=', '=='):
+        if value is False or value is None:
+            return is_null
+        return not is_null and current == _coerce(current, value)
+    if operator in ('!=', '<>'):
+        if value is False or value is None:
+            return not is_null
+        return is_null or current != _coerce(current, value)
+    if operator == 'in':
+        return not is_null and current in value
+    if operator == 'not in':
+        return is_null or current not in value
+    if operator in ('ilike', 'like'):
+        if is_null:
+            return False
+        if operator == 'ilike':
+            return str(value).lower() in str(current).lower()
+        return str(value) in str(current)
+    if operator == 'not ilike':
+        return is_null or str(value).lower() not in str(current).lower()
+    if operator == 'not like':
+        return is_null or str(value) not in str(current)
+    if is_null:
+        return False
+
+    value = _coerce(current, value)
+    if operator == '<':
+        return current < value
+    if operator == '<=':
+        return current <= value
+    if operator == '>':
+        return current > value
+    if operator == '>=':
+        return current >= value
+    raise ValueError(f"Operador de dominio no soportado: {operator}")
+
+
+def match_domain(record: dict, domain: list) -> bool:
+    """Evalúa un dominio de Odoo (notación polaca con ``&``, ``|`` y ``!``) sobre un registro.
+
+    Args:
+        record: Registro tal y como lo devuelve ``search_read``.
+        domain: Dominio de Odoo. Los términos consecutivos se combinan con ``&``.
+
+    Returns:
+        True si el registro cumple el dominio.
+    """
+    def _evaluate(position: int) -> tuple[bool, int]:
+        item = domain[position]
+        if item == '!':
+            result, position = _evaluate(position + 1)
+            return not result, position
+        if item in ('&', '|'):
+            left, position = _evaluate(position + 1)
+            right, position = _evaluate(position)
+            return (left and right) if item == '&' else (left or right), position
+        return match_term(record, item), position + 1
+
+    position = 0
+    while position < len(domain):
+        result, position = _evaluate(position)
+        if not result:
+            return False
+    return True
+
+
+def _sort_value(record: dict, field: str) -> Any:
+    """Valor de ordenación de un campo (los many2one se ordenan por id)."""
+    value = record.get(field, False)
+    if isinstance(value, (list, tuple)):
+        value = value[0]
+    return value
+
+
+def _sort_key(record: dict, field: str) -> tuple:
+    """Clave de ordenación: (es vacío, valor). Solo False y None cuentan como vacíos, no 0 ni ''."""
+    value = _sort_value(record, field)
+    if value is False or value is None:
+        return True, 0
+    return False, value
+
+
+def sort_records(records: list, order: str = None) -> list:
+    """Ordena registros según una cláusula ``order`` de Odoo (ej. ``'invoice_date_due asc, id asc'``).
+
+    Como en PostgreSQL, los valores vacíos van al final en orden ascendente
+    y al principio en descendente.
+    """
+    records = list(records)
+    # Ordenación estable de la última clave a la primera
+    for clause in reversed([c.strip() for c in (order or 'id asc').split(',')]):
+        field, _, direction = clause.partition(' ')
+        records.sort(
+            key=lambda r: _sort_key(r, field),
+            reverse=direction.strip().lower() == 'desc'
+        )
+    return records
+
+
+def domain_fields(domain: list) -> set[str]:
+    """Devuelve los campos (sin subcampo) usados en los términos de un dominio."""
+    return {term[0].split('.')[0] for term in domain if isinstance(term, (list, tuple))}
+
+
+def split_domain(domain: list) -> list[list]:
+    """Divide un dominio en sus operandos de primer nivel, que se combinan con ``&``.
+
+    Ej. ``[A, '|', B, C]`` -> ``[[A], ['|', B, C]]``. Los ``&`` de primer nivel
+    se descartan porque equivalen a la conjunción implícita.
+
+    Raises:
+        ValueError: Si a un operador le faltan operandos.
+    """
+    def _end(position: int) -> int:
+        if position >= len(domain):
+            raise ValueError(f"Dominio incompleto: {domain}")
+        item = domain[position]
+        if item == '!':
+            return _end(position + 1)
+        if item in ('&', '|'):
+            return _end(_end(position + 1))
+        return position + 1
+
+    parts = []
+    position = 0
+    while position < len(domain):
+        if domain[position] == '&':
+            position += 1
+            continue
+        end = _end(position)
+        parts.append(list(domain[position:end]))
+        position = end
+    return parts
@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def freeze(value: Any) -> Hashable:
+    """Convierte listas, tuplas y diccionarios anidados en una clave hashable.
+
+    Permite usar dominios de Odoo (listas de tuplas con listas dentro) como
+    parte de una clave de diccionario.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes idénticas en una sola ejecución.
+
+    La primera llamada con una clave lanza la corrutina; las que llegan
+    mientras sigue en curso esperan el mismo resultado (o la misma excepción)
+    en lugar de repetir el trabajo. Al terminar, la clave se libera y la
+    siguiente llamada vuelve a ejecutarse: no es una caché.
+
+    Attributes:
+        requests (int): Llamadas recibidas.
+        executed (int): Llamadas que se han ejecutado realmente.
+        coalesced (int): Llamadas que han reutilizado una ejecución en curso.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta ``func()`` o se une a la ejecución en curso con la misma clave.
+
+        Args:
+            key: Clave hashable que identifica la operación.
+            func: Función sin argumentos que devuelve la corrutina a ejecutar.
+
+        Returns:
+            Resultado de la corrutina compartida.
+        """
+        self.requests += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: cancelar a un llamante no cancela la ejecución de los demás
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> dict:
+        """Devuelve los contadores de llamadas.
+
+        Returns:
+            Diccionario con llamadas recibidas, ejecutadas, agrupadas,
+            ratio de agrupación y ejecuciones en curso.
+        """
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalesce_ratio": round(self.coalesced / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self._in_flight),
+        }